@@ -0,0 +1,350 @@
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+import cv2
+import numpy as np
+import Tracking_functions as tc
+
+
+#tank containers of the example videos (640x360), scaled to the resolution of each synthetic video
+example_tanks = ((184, 10, 281, 156), (312, 11, 398, 157))
+
+#benchmark scenarios: resolution, length, noise (standard deviation of the pixel noise) and ripples (new ripples per second in each tank)
+scenarios = {
+    "clean": {"width": 640, "height": 360, "nframes": 1500, "noise": 2, "ripples": 0},
+    "noisy": {"width": 640, "height": 360, "nframes": 1500, "noise": 8, "ripples": 0},
+    "ripples": {"width": 640, "height": 360, "nframes": 1500, "noise": 3, "ripples": 4},
+    "hd": {"width": 1280, "height": 720, "nframes": 750, "noise": 3, "ripples": 1},
+}
+
+#tracker settings used for every scenario (the defaults of Track_Tadpole.py)
+settings = {"sub_varThreshold": 150, "sub_learn_rate": -1, "blur_kernal": (1, 1), "min_area": 100, "max_area": 900}
+
+
+def scale_tanks(width, height, tanks=example_tanks):
+    """
+    This function scales tank containers given for a 640x360 video to a video of width x height pixels.
+
+    Parameters
+    ----------
+    width: int
+        width of the video in pixels
+    height: int
+        height of the video in pixels
+    tanks: list
+        tank container rectangles (x top left, y top left, x bottom right, y bottom right) in a 640x360 video
+    """
+    sx = width / 640
+    sy = height / 360
+    return [(int(x1 * sx), int(y1 * sy), int(x2 * sx), int(y2 * sy)) for x1, y1, x2, y2 in tanks]
+
+def make_synthetic_video(video, width=640, height=360, nframes=1500, fps=25, noise=3, ripples=0, radius=6, seed=0):
+    """
+    This function writes a synthetic tadpole video: a dark blob (the tadpole) moving on a lit background inside each tank,
+    with bouts of swimming and resting, pixel noise and water ripples (expanding rings) as distractors.
+    Returns the tank containers and the true centroid of the tadpole in each tank, as an array of shape(n_tanks, nframes, 2)
+    (frame 1 of the video is index 0).
+
+    Parameters
+    ----------
+    video: str
+        location of the video file to write (.mp4)
+    width: int
+        width of the video in pixels
+    height: int
+        height of the video in pixels
+    nframes: int
+        number of frames in the video
+    fps: int
+        number of frames per second
+    noise: float
+        standard deviation of the pixel noise added to each frame
+    ripples: float
+        number of new ripples per second in each tank
+    radius: int
+        radius of the tadpole in pixels, the default gives a tadpole between the min_area and max_area used by the benchmark
+    seed: int
+        seed of the random number generator, the same seed gives the same video
+    """
+    rng = np.random.default_rng(seed)
+    cv2.setRNGSeed(seed) #pixel noise
+    tanks = scale_tanks(width, height)
+    truth = np.zeros((len(tanks), nframes, 2), np.int64)
+    #start each tadpole in the middle of its tank, resting
+    pos = np.array([((x1 + x2) / 2, (y1 + y2) / 2) for x1, y1, x2, y2 in tanks])
+    vel = np.zeros_like(pos)
+    swim = np.zeros(len(tanks), np.int64) #frames left in the current bout of swimming
+    rest = rng.integers(1, 25, len(tanks)) #frames left in the current rest
+    active_ripples = [] #(x, y, age) of each ripple
+    writer = cv2.VideoWriter(video, cv2.VideoWriter_fourcc(*'mp4v'), fps, (width, height))
+    if not writer.isOpened():
+        raise IOError("could not write video {}".format(video))
+    pixel_noise = np.empty((height, width, 3), np.int16)
+    background = np.full((height, width, 3), 40, np.uint8) #dark surroundings
+    for x1, y1, x2, y2 in tanks:
+        cv2.rectangle(background, (x1, y1), (x2, y2), (215, 215, 215), -1) #tanks lit from below
+    try:
+        for i in range(nframes):
+            frame = background.copy()
+            #ripples: rings growing from a random point in a tank for 12 frames
+            for t, (x1, y1, x2, y2) in enumerate(tanks):
+                if rng.random() < ripples / fps:
+                    active_ripples.append((rng.uniform(x1, x2), rng.uniform(y1, y2), 0))
+            for x, y, age in active_ripples:
+                cv2.circle(frame, (int(x), int(y)), int(radius + 3 * age), (175, 175, 175), 2)
+            active_ripples = [(x, y, age + 1) for x, y, age in active_ripples if age < 12]
+            #tadpoles: swim in a straight line (with some turning) for a bout, then rest
+            for t, (x1, y1, x2, y2) in enumerate(tanks):
+                if swim[t] > 0:
+                    swim[t] -= 1
+                    angle = rng.normal(0, 0.15) #turn a little
+                    vel[t] = (vel[t][0] * np.cos(angle) - vel[t][1] * np.sin(angle), vel[t][0] * np.sin(angle) + vel[t][1] * np.cos(angle))
+                    if swim[t] == 0:
+                        rest[t] = rng.integers(10, 75)
+                        vel[t] = 0
+                else:
+                    rest[t] -= 1
+                    if rest[t] == 0:
+                        swim[t] = rng.integers(10, 50)
+                        angle = rng.uniform(0, 2 * np.pi)
+                        vel[t] = rng.uniform(1, 4) * np.array((np.cos(angle), np.sin(angle)))
+                pos[t] += vel[t]
+                #bounce off the walls of the tank
+                margin = radius + 3
+                for axis, low, high in ((0, x1 + margin, x2 - margin), (1, y1 + margin, y2 - margin)):
+                    if pos[t][axis] < low or pos[t][axis] > high:
+                        vel[t][axis] = -vel[t][axis]
+                        pos[t][axis] = min(max(pos[t][axis], low), high)
+                cx, cy = int(round(pos[t][0])), int(round(pos[t][1]))
+                cv2.ellipse(frame, (cx, cy), (radius + 2, radius), float(np.degrees(np.arctan2(vel[t][1], vel[t][0]))), 0, 360, (25, 25, 25), -1)
+                truth[t, i] = (cx, cy)
+            if noise:
+                cv2.randn(pixel_noise, 0, noise)
+                frame = cv2.add(frame, pixel_noise, dtype=cv2.CV_8U)
+            writer.write(frame)
+    finally:
+        writer.release()
+    return tanks, truth
+
+def load_frames(video, rois):
+    """
+    This function decodes a video once and keeps the greyscale tank container of each roi in memory,
+    so the tracking pipeline can be timed separately from decoding.
+    Returns the frames (one array of shape(nframes, n_rows, n_cols) for each roi) and the time spent decoding in seconds.
+
+    Parameters
+    ----------
+    video: str
+        location of the video file
+    rois: list
+        tank container rectangles (see tc.tank_roi)
+    """
+    cap = cv2.VideoCapture(video)
+    if not cap.isOpened():
+        raise IOError("could not open video {}".format(video))
+    start = time.perf_counter()
+    frames = [[] for roi in rois]
+    try:
+        while True:
+            frame = cap.read()[1]
+            if frame is None:
+                break
+            for crops, roi in zip(frames, rois):
+                crops.append(cv2.cvtColor(tc.crop_roi(frame, roi), cv2.COLOR_BGR2GRAY))
+    finally:
+        cap.release()
+    return [np.array(crops) for crops in frames], time.perf_counter() - start
+
+def track_frames(frames, roi, sub_varThreshold, sub_learn_rate, blur_kernal, min_area, max_area, skip_idle=False):
+    """
+    This function runs create_mask -> detect_contours -> calculate_distance with a tc.Tracker (as in a headless Track_Tadpole.py run)
+    on the frames of one tank. Returns the centroid in each frame, shape(nframes, 2), and the cumulative distance travelled.
+
+    Parameters
+    ----------
+    frames: ndarray, shape(nframes, n_rows, n_cols)
+        greyscale tank container in each frame
+    roi: array, int
+        tank container rectangle, to map the centroids back to whole frame coordinates
+    sub_varThreshold, sub_learn_rate, blur_kernal, min_area, max_area:
+        tracker settings (see Track_Tadpole.py)
+    skip_idle: bool
+        if True frames where nothing has moved are not tracked and the last centroid is carried forward (see tc.MotionGate)
+    """
+    tracker = tc.Tracker(roi, sub_varThreshold, sub_learn_rate, blur_kernal, min_area, max_area, skip_idle=skip_idle)
+    centroids = np.zeros((len(frames), 2), np.int64)
+    cumul_dist_travelled = 0
+    for i, record in enumerate(tracker.stream(enumerate(frames))):
+        centroids[i] = (record.cx, record.cy)
+        cumul_dist_travelled = record.cumulative
+    return centroids, cumul_dist_travelled
+
+def centroid_error(centroids, truth, warmup=10):
+    """
+    This function compares tracked centroids with the true centroids of a synthetic video.
+    Frames where no tadpole was found (centroid 0) are counted as lost, the error is calculated for the other frames.
+    The first warmup frames are ignored while the background subtractor learns the background.
+
+    Parameters
+    ----------
+    centroids: ndarray, shape(nframes, 2)
+        tracked centroids
+    truth: ndarray, shape(nframes, 2)
+        true centroids
+    warmup: int
+        number of frames ignored at the start of the video
+    """
+    centroids = centroids[warmup:]
+    truth = truth[warmup:]
+    found = (centroids != 0).all(axis=1)
+    error = np.hypot(*(centroids[found] - truth[found]).T)
+    return {"lost_frames": int((~found).sum()),
+            "mean_px": float(error.mean()) if len(error) else float('nan'),
+            "p95_px": float(np.percentile(error, 95)) if len(error) else float('nan'),
+            "max_px": float(error.max()) if len(error) else float('nan')}
+
+def path_length(truth):
+    """
+    This function returns the total distance travelled along a track of true centroids, in pixels.
+    """
+    return float(np.hypot(*np.diff(truth, axis=0).T).sum())
+
+def peak_rss_mb():
+    """
+    This function returns the peak memory (resident set size) used by this process in MB.
+    """
+    try:
+        import resource
+    except ImportError: #not available on Windows
+        return float('nan')
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 ** 2 if sys.platform == "darwin" else peak / 1024 #bytes on macOS, KB on Linux
+
+def run_scenario(name, video_dir, width, height, nframes, noise, ripples, seed=0, skip_idle=False):
+    """
+    This function writes the synthetic video of one scenario, tracks every tank and returns
+    the frames per second (decoding, tracking and both together), memory use and centroid error of each tank.
+
+    Parameters
+    ----------
+    name: str
+        name of the scenario, used for the video file name
+    video_dir: str
+        folder where the synthetic video is written
+    width, height, nframes, noise, ripples:
+        see make_synthetic_video
+    seed: int
+        seed of the random number generator
+    skip_idle: bool
+        if True frames where nothing has moved are not tracked (see track_frames)
+    """
+    video = os.path.join(video_dir, 'synthetic_{}.mp4'.format(name))
+    tanks, truth = make_synthetic_video(video, width, height, nframes, noise=noise, ripples=ripples, seed=seed)
+    frames, decode_seconds = load_frames(video, tanks)
+    nframes = len(frames[0])
+    #time the tracking pipeline
+    start = time.perf_counter()
+    tracks = [track_frames(tank_frames, roi, skip_idle=skip_idle, **settings) for tank_frames, roi in zip(frames, tanks)]
+    track_seconds = time.perf_counter() - start
+    #track again to measure the memory allocated by the pipeline (tracemalloc slows python code so is not timed)
+    tracemalloc.start()
+    track_frames(frames[0], tanks[0], skip_idle=skip_idle, **settings)
+    peak_traced = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    result = {"width": width, "height": height, "frames": nframes, "noise": noise, "ripples": ripples,
+              "decode_fps": nframes / decode_seconds,
+              "track_fps": nframes / track_seconds,
+              "total_fps": nframes / (decode_seconds + track_seconds),
+              "peak_traced_mb": peak_traced / 1024 ** 2,
+              "peak_rss_mb": peak_rss_mb(),
+              "tanks": []}
+    for (centroids, cumul_dist_travelled), tank_truth in zip(tracks, truth):
+        tank = centroid_error(centroids, tank_truth[:nframes])
+        tank["dist_px"] = cumul_dist_travelled
+        tank["true_dist_px"] = path_length(tank_truth[:nframes])
+        result["tanks"].append(tank)
+    return result
+
+def print_results(results):
+    """
+    This function prints the benchmark results as a table.
+    """
+    print("{:<10}{:>11}{:>8}{:>10}{:>10}{:>10}{:>9}{:>9}{:>9}{:>8}".format(
+        "scenario", "resolution", "frames", "dec_fps", "trk_fps", "all_fps", "rss_mb", "err_px", "p95_px", "lost"))
+    for name, result in results.items():
+        tanks = result["tanks"]
+        print("{:<10}{:>11}{:>8}{:>10.0f}{:>10.0f}{:>10.0f}{:>9.1f}{:>9.2f}{:>9.2f}{:>8}".format(
+            name, "{}x{}".format(result["width"], result["height"]), result["frames"],
+            result["decode_fps"], result["track_fps"], result["total_fps"], result["peak_rss_mb"],
+            np.mean([tank["mean_px"] for tank in tanks]), max(tank["p95_px"] for tank in tanks),
+            sum(tank["lost_frames"] for tank in tanks)))
+
+def compare_results(baseline, results, fps_tolerance=0.15, error_tolerance=0.5):
+    """
+    This function compares benchmark results with saved baseline results.
+    Returns a list of regressions: scenarios where tracking is more than fps_tolerance slower (eg 0.15 = 15%)
+    or the mean centroid error is more than error_tolerance pixels worse.
+
+    Parameters
+    ----------
+    baseline: dict
+        results of the baseline run
+    results: dict
+        results of this run
+    fps_tolerance: float
+        the proportion the tracking frames per second can drop before it is a regression
+    error_tolerance: float
+        the number of pixels the mean centroid error can increase before it is a regression
+    """
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        old = baseline[name]
+        if result["track_fps"] < old["track_fps"] * (1 - fps_tolerance):
+            regressions.append("{}: track_fps {:.0f} -> {:.0f}".format(name, old["track_fps"], result["track_fps"]))
+        for t, (old_tank, tank) in enumerate(zip(old["tanks"], result["tanks"])):
+            if tank["mean_px"] > old_tank["mean_px"] + error_tolerance:
+                regressions.append("{} tank {}: centroid error {:.2f} -> {:.2f} px".format(name, t, old_tank["mean_px"], tank["mean_px"]))
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the Tadpole Tracker on synthetic videos with known tadpole positions.")
+    parser.add_argument("scenarios", nargs="*", default=list(scenarios), help="scenarios to run ({}), default all".format(', '.join(scenarios)))
+    parser.add_argument("--frames", type=int, help="number of frames in each video (overrides the scenario)")
+    parser.add_argument("--video-dir", help="keep the synthetic videos in this folder (default a temporary folder)")
+    parser.add_argument("--save", help="save the results to this json file, eg as a baseline")
+    parser.add_argument("--compare", help="compare with a baseline json file and exit with 1 if tracking is slower or less accurate")
+    parser.add_argument("--fps-tolerance", type=float, default=0.15, help="proportion tracking fps can drop before it is a regression (default 0.15)")
+    parser.add_argument("--skip-idle", action="store_true", help="skip the frames where nothing moves (skip_idle in Track_Tadpole.py)")
+    args = parser.parse_args()
+
+    cv2.setNumThreads(1) #time a single core, as in the batch worker processes
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        video_dir = args.video_dir or tmp_dir
+        os.makedirs(video_dir, exist_ok=True)
+        for name in args.scenarios:
+            scenario = dict(scenarios[name])
+            if args.frames:
+                scenario["nframes"] = args.frames
+            results[name] = run_scenario(name, video_dir, skip_idle=args.skip_idle, **scenario)
+    print_results(results)
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=1)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare_results(baseline, results, args.fps_tolerance)
+        for regression in regressions:
+            print("REGRESSION", regression)
+        if regressions:
+            sys.exit(1)
+        print("no regressions compared with", args.compare)
@@ -0,0 +1,166 @@
+import hashlib
+import json
+import os
+import numpy as np
+
+
+class FrameCache:
+    """
+    This class keeps the greyscale tank container of every frame of a video on disk, so that the video only has to be decoded once.
+    Later runs (tracking again, tuning the tracker settings, see Tracking_sweep.py) read the frames straight from the
+    cache files as memory-mapped arrays, with no decoding, greyscale conversion or copying.
+    Each tank is stored in its own raw uint8 file (and a small json file describing it), named by a key made from
+    the location, modification time and size of the video, the tank container rectangle and the last frame read,
+    so the frames of a video which has been changed or replaced are never used.
+    When the cache holds more than max_gb, the least recently used files are deleted.
+
+    Parameters
+    ----------
+    cache_dir: str
+        folder where the cache files are stored
+    max_gb: float
+        the maximum size of the cache in gigabytes
+    """
+    def __init__(self, cache_dir, max_gb=20):
+        self.cache_dir = cache_dir
+        self.max_bytes = int(max_gb * 1024**3)
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def key(self, vidx, roi, end_frame):
+        """
+        Returns the name of the cache files of one tank container of a video.
+        """
+        stat = os.stat(vidx)
+        video = [os.path.abspath(vidx), stat.st_mtime_ns, stat.st_size, [int(v) for v in roi], int(end_frame)]
+        name = os.path.splitext(os.path.basename(vidx))[0]
+        return '_'.join((name, '_'.join(str(int(v)) for v in roi), hashlib.sha1(json.dumps(video).encode()).hexdigest()[:12]))
+
+    def _paths(self, key):
+        return os.path.join(self.cache_dir, key + '.raw'), os.path.join(self.cache_dir, key + '.json')
+
+    def get(self, vidx, rois, end_frame):
+        """
+        Returns the frame numbers and a list of memory-mapped arrays, shape(nframes, n_rows, n_cols), one for each roi,
+        or None if any of the rois of this video is not in the cache.
+        """
+        entries = []
+        for roi in rois:
+            raw, info_json = self._paths(self.key(vidx, roi, end_frame))
+            if not (os.path.exists(raw) and os.path.exists(info_json)):
+                return None
+            with open(info_json) as f:
+                entries.append((raw, info_json, json.load(f)))
+        frames = []
+        for raw, info_json, info in entries:
+            os.utime(info_json) #mark as recently used
+            shape = (info["nframes"], info["height"], info["width"])
+            if info["nframes"] == 0:
+                frames.append(np.empty(shape, np.uint8))
+            else:
+                frames.append(np.memmap(raw, np.uint8, 'r', shape=shape))
+        first_frame = entries[0][2]["first_frame"]
+        return np.arange(first_frame, first_frame + entries[0][2]["nframes"], dtype=np.int64), frames
+
+    def writer(self, vidx, rois, end_frame):
+        """
+        Returns a CacheWriter to store the frames of each roi of a video as they are decoded.
+        """
+        return CacheWriter(self, [self.key(vidx, roi, end_frame) for roi in rois], vidx, rois, end_frame)
+
+    def evict(self, keep=()):
+        """
+        Delete the least recently used cache files until the cache is smaller than max_gb. The keys in keep are never deleted.
+        """
+        entries = []
+        for f in os.listdir(self.cache_dir):
+            if not f.endswith('.json'):
+                continue
+            key = f[:-len('.json')]
+            raw, info_json = self._paths(key)
+            if os.path.exists(raw):
+                entries.append((os.path.getmtime(info_json), key, os.path.getsize(raw)))
+        total = sum(size for last_used, key, size in entries)
+        for last_used, key, size in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if key in keep:
+                continue
+            for path in self._paths(key):
+                os.remove(path)
+            total -= size
+
+    def clear(self):
+        """
+        Delete every file in the cache.
+        """
+        for f in os.listdir(self.cache_dir):
+            if f.endswith(('.raw', '.json', '.part')):
+                os.remove(os.path.join(self.cache_dir, f))
+
+
+class CacheWriter:
+    """
+    This class writes the greyscale tank containers of a video into the cache (see FrameCache.writer), one frame at a time.
+    The frames are written to temporary files which only become part of the cache when close() is called after the last frame,
+    so an interrupted decode never leaves an incomplete video in the cache.
+
+    Parameters
+    ----------
+    cache: FrameCache
+        the cache the frames are written to
+    keys: list
+        name of the cache files of each roi
+    vidx: str
+        location of the video file
+    rois: list
+        tank container rectangles (see tank_roi in Tracking_functions.py)
+    end_frame: int
+        the last frame read
+    """
+    def __init__(self, cache, keys, vidx, rois, end_frame):
+        self.cache = cache
+        self.keys = keys
+        self.info = [{"video": os.path.abspath(vidx), "roi": [int(v) for v in roi], "end_frame": int(end_frame),
+                      "height": int(roi[3] - roi[1] + 1), "width": int(roi[2] - roi[0] + 1), "first_frame": None, "nframes": 0}
+                     for roi in rois]
+        self._files = [open(cache._paths(key)[0] + '.part', 'wb') for key in keys]
+        self._closed = False
+
+    def append(self, frame_pos, crops):
+        """
+        Write the greyscale tank container of each roi in one frame.
+        """
+        for f, info, crop in zip(self._files, self.info, crops):
+            if info["first_frame"] is None:
+                info["first_frame"] = int(frame_pos)
+                info["height"], info["width"] = crop.shape #crops at the edge of the frame can be smaller than the roi
+            f.write(np.ascontiguousarray(crop).data)
+            info["nframes"] += 1
+
+    def close(self):
+        """
+        Add the frames to the cache and delete the least recently used files if the cache is too big.
+        """
+        if self._closed:
+            return
+        self._closed = True
+        for f, key, info in zip(self._files, self.keys, self.info):
+            f.close()
+            raw, info_json = self.cache._paths(key)
+            os.replace(raw + '.part', raw)
+            if info["first_frame"] is None:
+                info["first_frame"] = 0
+            with open(info_json, 'w') as myinfo:
+                json.dump(info, myinfo)
+        self.cache.evict(keep=self.keys)
+
+    def abort(self):
+        """
+        Delete the frames written so far, eg if the video could not be decoded.
+        """
+        if self._closed:
+            return
+        self._closed = True
+        for f, key in zip(self._files, self.keys):
+            f.close()
+            os.remove(self.cache._paths(key)[0] + '.part')
@@ -0,0 +1,133 @@
+import hashlib
+import json
+import os
+
+
+def job_name(vidx, tanks=()):
+    """
+    This function returns a name for the files kept for a tracking job (checkpoint and profile files): the name of the video file, 
+    the tanks tracked in the job and a short hash of the full location of the video. 
+    Jobs tracking different tanks of the same video (multi_roi = False) and videos with the same file name in different folders 
+    (eg MVI_1203.MP4 from different camera cards) do not share files.
+
+    Parameters
+    ----------
+    vidx: str
+        location of the video file
+    tanks: list
+        tadpoleID_trial of each tank tracked in the job
+    """
+    name = os.path.splitext(os.path.basename(vidx))[0]
+    return '_'.join((name, *sorted(tanks), hashlib.sha1(os.path.abspath(vidx).encode()).hexdigest()[:8]))
+
+def checkpoint_path(results_dir, vidx, tanks=()):
+    """
+    This function returns the location of the checkpoint file of a tracking job (results_dir/checkpoint_videoname_tanks_hash.json, see job_name).
+
+    Parameters
+    ----------
+    results_dir: str
+        folder where the results files are stored
+    vidx: str
+        location of the video file
+    tanks: list
+        tadpoleID_trial of each tank tracked in the job
+    """
+    return os.path.join(results_dir, 'checkpoint_' + job_name(vidx, tanks) + '.json')
+
+def _points(points):
+    #centroids are stored as lists in json, tuples are used for tracking (see detect_contours)
+    return [tuple(int(v) for v in point) if point is not None else None for point in points]
+
+def tank_state(tracker, myresults):
+    """
+    This function returns what is needed to carry on tracking one tank from the last frame tracked:
+    the centroid lists, running total of the distance travelled and the rows already written to the results file.
+    The background subtractor cannot be saved, it is re-trained on the frames before the checkpoint when the video is resumed.
+
+    Parameters
+    ----------
+    tracker: Tracker
+        tracker of one tank (see Tracker in Tracking_functions.py)
+    myresults: ResultsWriter
+        results file of the tank
+    """
+    return {"results": myresults.path,
+            "results_offset": myresults.checkpoint(),
+            "prev_x": [int(v) for v in tracker.prev_x], "prev_y": [int(v) for v in tracker.prev_y], "prev_xy": _points(tracker.prev_xy),
+            "pts": _points(tracker.pts), "cxpts": [int(v) for v in tracker.cxpts], "cypts": [int(v) for v in tracker.cypts],
+            "dist_nframes": tracker.dist_travelled.nframes, "dist_total": tracker.dist_travelled.total}
+
+def restore_tank(tracker, state):
+    """
+    This function puts the state saved by tank_state back into the tracker of a tank.
+
+    Parameters
+    ----------
+    tracker: Tracker
+        tracker of one tank (see Tracker in Tracking_functions.py)
+    state: dict
+        state of the tank saved in the checkpoint
+    """
+    for key in ("prev_x", "prev_y", "cxpts", "cypts"):
+        getattr(tracker, key).clear()
+        getattr(tracker, key).extend(state[key])
+    for key in ("prev_xy", "pts"):
+        getattr(tracker, key).clear()
+        getattr(tracker, key).extend(_points(state[key]))
+    tracker.dist_travelled.nframes = state["dist_nframes"]
+    tracker.dist_travelled.total = state["dist_total"]
+
+def save_checkpoint(checkpoint_json, vidx, tanks, frame_pos, settings, complete=False):
+    """
+    This function saves the state of every tank of a video after frame_pos has been tracked.
+    The results files are flushed first, so they hold exactly the frames up to frame_pos.
+    The checkpoint is written to a temporary file and then renamed, so an interruption never leaves a half written checkpoint.
+
+    Parameters
+    ----------
+    checkpoint_json: str
+        location of the checkpoint file (see checkpoint_path)
+    vidx: str
+        location of the video file
+    tanks: list
+        the tracker ("tracker") and results file ("myresults") of each tank (see track_video in Tracking_functions.py)
+    frame_pos: int
+        the last frame tracked
+    settings: dict
+        the tracker settings, a checkpoint is only resumed with the same settings
+    complete: bool
+        True when the whole video has been tracked, so it is skipped when the batch is resumed
+    """
+    checkpoint = {"video": vidx, "frame": int(frame_pos), "complete": complete, "settings": settings,
+                  "tanks": [tank_state(tank["tracker"], tank["myresults"]) for tank in tanks]}
+    with open(checkpoint_json + '.part', 'w') as mycheckpoint:
+        json.dump(checkpoint, mycheckpoint)
+    os.replace(checkpoint_json + '.part', checkpoint_json)
+
+def load_checkpoint(checkpoint_json, vidx, results, settings):
+    """
+    This function reads the checkpoint of a video.
+    Returns the checkpoint, or None if there is no checkpoint or it does not match this video, these results files and tracker settings
+    (or a results file is missing), in which case the video is tracked from the start.
+
+    Parameters
+    ----------
+    checkpoint_json: str
+        location of the checkpoint file (see checkpoint_path)
+    vidx: str
+        location of the video file
+    results: list
+        location of the results file of each tank
+    settings: dict
+        the tracker settings
+    """
+    if not os.path.exists(checkpoint_json):
+        return None
+    with open(checkpoint_json) as mycheckpoint:
+        checkpoint = json.load(mycheckpoint)
+    if (checkpoint["video"] != vidx or json.loads(json.dumps(settings)) != checkpoint["settings"]
+            or [tank["results"] for tank in checkpoint["tanks"]] != list(results)
+            or not all(os.path.exists(results_fn) for results_fn in results)):
+        return None
+    return checkpoint
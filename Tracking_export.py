@@ -0,0 +1,119 @@
+import queue
+import threading
+import cv2
+
+
+class VideoExporter:
+    """
+    This class writes the annotated tracking images of one tank (trail, HUD and output modes, see track_video) to a video file,
+    so the tracking can be checked afterwards without watching it live. The images are encoded on a background thread,
+    fed through a bounded queue, so encoding does not slow down the tracking loop (when the queue is full the tracking loop waits).
+    Call want_frame() once for every frame tracked: it returns True for the frames which are exported (every export_every-th frame),
+    and only those frames need to be annotated and passed to write().
+    Call close() (or use the exporter in a with statement) when the video is finished so the last frames are written.
+
+    Parameters
+    ----------
+    video_out: str
+        location of the video file written (eg Tracking_files/ACT_tadpoleID_trial.mp4)
+    fps: float
+        number of frames per second in the tracked video. The exported video plays at fps / export_every so it keeps the same speed
+    export_every: int
+        only every export_every-th frame is exported
+    export_scale: float
+        the images are resized by this factor before they are encoded (eg 0.5 = half the width and height)
+    maxsize: int
+        the maximum number of images waiting to be encoded
+    fourcc: str
+        four letter code of the video codec
+    """
+    def __init__(self, video_out, fps, export_every=1, export_scale=1.0, maxsize=32, fourcc="mp4v"):
+        self.video_out = video_out
+        self.fps = max(fps / export_every, 1)
+        self.export_every = export_every
+        self.export_scale = export_scale
+        self.fourcc = fourcc
+        self.nframes = 0 #number of frames tracked
+        self.written = 0 #number of images encoded
+        self.error = None
+        self._images = queue.Queue(maxsize=maxsize)
+        self._thread = threading.Thread(target=self._encode, daemon=True)
+        self._thread.start()
+        self._closed = False
+
+    def want_frame(self):
+        """
+        Count a tracked frame and return True if it should be exported.
+        """
+        export = self.nframes % self.export_every == 0
+        self.nframes += 1
+        return export
+
+    def write(self, image):
+        """
+        Queue an annotated image (colour or greyscale) to be encoded. The image must not be changed afterwards.
+        """
+        if image is None:
+            raise ValueError("no image to write to {}".format(self.video_out)) #None tells the encoder the video is finished
+        if self.error is not None:
+            raise self.error
+        while True:
+            try:
+                self._images.put(image, timeout=0.1)
+                return
+            except queue.Full:
+                if not self._thread.is_alive():
+                    raise self.error or IOError("the video encoder of {} has stopped".format(self.video_out))
+
+    def _encode(self):
+        writer = None
+        try:
+            while True:
+                image = self._images.get()
+                if image is None:
+                    break
+                if self.export_scale != 1:
+                    image = cv2.resize(image, None, fx=self.export_scale, fy=self.export_scale, interpolation=cv2.INTER_AREA)
+                if image.ndim == 2:
+                    image = cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+                if writer is None:
+                    #the size of the video is the size of the first image
+                    writer = cv2.VideoWriter(self.video_out, cv2.VideoWriter_fourcc(*self.fourcc), self.fps, (image.shape[1], image.shape[0]))
+                    if not writer.isOpened():
+                        raise IOError("could not open {} for writing".format(self.video_out))
+                writer.write(image)
+                self.written += 1
+        except Exception as error:
+            self.error = error
+            while True: #let the tracking loop carry on, the error is raised by write() or close()
+                try:
+                    if self._images.get(timeout=0.1) is None:
+                        break
+                except queue.Empty:
+                    pass
+        finally:
+            if writer is not None:
+                writer.release()
+
+    def close(self):
+        """
+        Encode the images still waiting in the queue and close the video file.
+        """
+        if self._closed:
+            return
+        self._closed = True
+        while self._thread.is_alive(): #an encoder which has stopped cannot empty the queue
+            try:
+                self._images.put(None, timeout=0.1) #tell the encoder the video is finished
+                break
+            except queue.Full:
+                continue
+        self._thread.join()
+        if self.error is not None:
+            raise self.error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -2,8 +2,351 @@ import cv2
 import imutils
 import numpy as np
 import math
+import os
+import queue
+import threading
+import time
+from collections import deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from Tracking_results import ResultsWriter, suffixes
+from Tracking_profiler import StageTimer, print_summary, save_summary
+from Tracking_cache import FrameCache
+from Tracking_checkpoint import checkpoint_path, load_checkpoint, save_checkpoint, restore_tank, job_name
+from Tracking_export import VideoExporter
 
 
+#columns of the txt file of video names (ACT_video_info.txt)
+BatchID = 0 #specify the column of batchnumbers
+TadpoleID = 1 #specify the column of tadpoleIDs
+TrialID = 2 #specify  the column of trial number per tadpoleID
+columnLR = 3 #specify the column which states if tadpole on left 'L' or right 'R'
+columnvid = 4 #specify the column containing the video directory location
+#next few columns specify the XY coordinates of the tadpole containers
+LXtop = 5 #L tadpole top left X
+LYtop = 6 #L tadpole top left y
+LXbottom = 7 #L tadpole bottom right x
+LYbottom = 8 #L tadpole bottom right y
+RXtop = 9 #R tadpole top left X
+RYtop = 10 #R tadpole top left Y
+RXbottom = 11 #R tadpole bottom right X
+RYbottom = 12 #R tadpole bottom left Y
+
+
+def read_video_info(video_info, Batch, BatchID=0):
+    """
+    This function reads the txt file of video names (ACT_video_info.txt) and returns the lines
+    belonging to the selected batch (or batches), split into columns.
+
+    Parameters
+    ----------
+    video_info: str
+        location of the txt file containing the tadpole and video information
+    Batch: str, list or None
+        the batch number to select lines for, a list of batch numbers, or None to select every line
+    BatchID: int
+        the column of batch numbers
+    """
+    with open(video_info, encoding="ISO-8859-1") as myfile:
+        myfile = myfile.readlines() #read all the lines of this file
+    if isinstance(Batch, str):
+        Batch = [Batch]
+    lines = []
+    for line in myfile[1:]: #ignore header line
+        line = line.strip().split() #removes unreadable characters from end of lines and splits the columns
+        if not line or (Batch is not None and line[BatchID] not in Batch): #ignore blank lines and lines from other batches
+            continue
+        lines.append(line)
+    return lines
+
+def group_by_video(lines, columnvid=4, multi_roi=True):
+    """
+    This function groups the lines of ACT_video_info.txt by their video column so that each 
+    video only needs to be decoded once, with every tank (L and R) listed for it tracked in the same pass.
+    Videos are returned in the order they first appear.
+
+    Parameters
+    ----------
+    lines: list
+        lines of ACT_video_info.txt split into columns (see read_video_info)
+    columnvid: int
+        the column containing the video directory location
+    multi_roi: bool
+        if False every line is returned as its own group, so a video is decoded once per tank
+    """
+    videos = []
+    groups = {}
+    for line in lines:
+        vidx = line[columnvid]
+        if multi_roi and vidx in groups:
+            groups[vidx].append(line)
+            continue
+        tank_lines = [line]
+        groups[vidx] = tank_lines
+        videos.append((vidx, tank_lines))
+    return videos
+
+def tank_roi(line):
+    """
+    This function returns the rectangle of the tank container (x top left, y top left, x bottom right, y bottom right) 
+    for the tadpole on the left 'L' or right 'R' of a line of ACT_video_info.txt. 
+    The bottom right corner is included in the tank.
+
+    Parameters
+    ----------
+    line: list
+        line of ACT_video_info.txt split into columns
+    """
+    if line[columnLR] == "R":
+        return (int(line[RXtop]), int(line[RYtop]), int(line[RXbottom]), int(line[RYbottom]))
+    if line[columnLR] == "L":
+        return (int(line[LXtop]), int(line[LYtop]), int(line[LXbottom]), int(line[LYbottom]))
+    raise ValueError("LR column should be 'L' or 'R', not {!r}".format(line[columnLR]))
+
+def crop_roi(frame, roi):
+    """
+    This function returns the tank container of a frame as a view (no pixels are copied), 
+    so the tracking functions only process the pixels of the tank instead of the whole frame. 
+    Anything drawn on the view is drawn on the frame.
+
+    Parameters
+    ----------
+    frame: ndarray, shape(n_rows, n_cols, 3)
+        source image with 3 colour channels
+    roi: array, int
+        tank container rectangle (see tank_roi)
+    """
+    return frame[roi[1]:roi[3] + 1, roi[0]:roi[2] + 1]
+
+def roi_to_frame(cx, cy, roi, margin=0):
+    """
+    This function maps a centroid found in a cropped tank container (see crop_roi) back to the coordinates of the whole frame. 
+    A centroid of 0 means no object was found and is left as 0.
+
+    Parameters
+    ----------
+    cx: int
+        x centroid in the tank container
+    cy: int
+        y centroid in the tank container
+    roi: array, int
+        tank container rectangle (see tank_roi)
+    margin: int
+        width of the border of zeros added around the tank container (see Tracker)
+    """
+    if cx != 0:
+        cx += roi[0] - margin
+    if cy != 0:
+        cy += roi[1] - margin
+    return cx, cy
+
+def frame_centre(cxcy, offset=(0, 0)):
+    """
+    This function returns True if a centroid is the centre of the frame (319,179) in whole frame coordinates. 
+    A centroid at the centre of the frame is not counted as the tadpole (see detect_contours and draw_lines).
+
+    Parameters
+    ----------
+    cxcy: array, int
+        centroid in the coordinates of an image (None if no centroid has been found yet)
+    offset: array, int
+        whole frame coordinates of the top left corner of the image, (0, 0) for the whole frame
+    """
+    return cxcy is not None and cxcy[0] + offset[0] == 319 and cxcy[1] + offset[1] == 179
+
+class FrameReader:
+    """
+    This class decodes a video on a background thread and hands the frames to the tracking loop through a bounded queue, 
+    so the next frames are decoded while the current frame is being tracked (OpenCV releases the GIL while decoding). 
+    When the queue is full the decoder waits for the tracking loop to catch up. 
+    Iterating over the reader gives (frame_pos, frame, crops) for each frame up to end_frame or the end of the video. 
+    If rois are given, crops holds the greyscale tank container of each roi (and frame is None), 
+    otherwise frame is the colour frame (and crops is None). 
+    Call close() (or use the reader in a with statement) to stop the decoder thread before releasing the video.
+
+    Parameters
+    ----------
+    cap: cv2.VideoCapture
+        the video to read the frames from
+    end_frame: int
+        the last frame to read
+    rois: list
+        tank container rectangles (see tank_roi) to crop and convert to greyscale on the decoder thread
+    maxsize: int
+        the maximum number of decoded frames waiting in the queue
+    frame_step: int
+        only every frame_step-th frame is returned, the frames in between are grabbed (decoded but not converted or cropped)
+    """
+    def __init__(self, cap, end_frame, rois=None, maxsize=32, frame_step=1):
+        self.cap = cap
+        self.end_frame = end_frame
+        self.rois = rois
+        self.frame_step = frame_step
+        self.error = None
+        self._frames = queue.Queue(maxsize=maxsize)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._decode, daemon=True)
+        self._thread.start()
+
+    def _put(self, item):
+        #wait for space in the queue, unless the reader is closed
+        while not self._stop.is_set():
+            try:
+                self._frames.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _decode(self):
+        try:
+            while not self._stop.is_set():
+                frame = self.cap.read() #for each frame, read from the video capture file
+                frame = frame[1] #handle the frame from the video capture file
+                frame_pos = self.cap.get(cv2.CAP_PROP_POS_FRAMES) #the frame number
+                #If video is finished - stop decoding
+                if frame_pos > self.end_frame or frame is None:
+                    break
+                if self.rois is None:
+                    item = (frame_pos, frame, None)
+                else:
+                    item = (frame_pos, None, [cv2.cvtColor(crop_roi(frame, roi), cv2.COLOR_BGR2GRAY) for roi in self.rois])
+                if not self._put(item):
+                    break
+                for skip in range(self.frame_step - 1):
+                    self.cap.grab() #skip the frames in between
+        except Exception as error:
+            self.error = error
+        finally:
+            self._put(None) #tell the tracking loop the video is finished
+
+    def __iter__(self):
+        while True:
+            item = self._frames.get()
+            if item is None:
+                break
+            yield item
+        if self.error is not None:
+            raise self.error
+
+    def close(self):
+        """
+        Stop the decoder thread and wait for it to finish.
+        """
+        self._stop.set()
+        while self._thread.is_alive():
+            try:
+                self._frames.get(timeout=0.1) #make space for a decoder waiting on a full queue
+            except queue.Empty:
+                pass
+        self._thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def read_roi_frames(vidx, rois, end_frame=None, cache=None):
+    """
+    This function decodes a video once and returns the greyscale tank container of each roi in every frame, 
+    so the same frames can be tracked many times (eg with different tracker settings, see Tracking_sweep.py) without decoding the video again. 
+    Frames are read from the same frame as track_video and up to end_frame (by default 10 mins of video). 
+    Returns the frame numbers and a list of arrays, shape(nframes, n_rows, n_cols), one for each roi.
+    If a cache is given, the frames are read from the cache as memory-mapped arrays when this video has been decoded before, 
+    otherwise they are decoded straight into the cache files (so the whole video is never held in memory).
+
+    Parameters
+    ----------
+    vidx: str
+        location of the video file
+    rois: list
+        tank container rectangles (see tank_roi)
+    end_frame: int
+        the last frame to read
+    cache: FrameCache
+        cache of decoded frames (see Tracking_cache.py)
+    """
+    cap = cv2.VideoCapture(vidx)
+    if not cap.isOpened():
+        raise IOError("could not open video {}".format(vidx))
+    if end_frame is None:
+        end_frame = int(600*int(cap.get(cv2.CAP_PROP_FPS))) #10 mins in secs * number of frames per second (fps)
+    if cache is not None:
+        cached = cache.get(vidx, rois, end_frame)
+        if cached is not None:
+            cap.release()
+            return cached
+        writer = cache.writer(vidx, rois, end_frame)
+    cap.set(1,1)
+    frame_numbers = []
+    frames = [[] for roi in rois]
+    try:
+        with FrameReader(cap, end_frame, rois) as reader:
+            for frame_pos, frame, crops in reader:
+                if cache is not None:
+                    writer.append(frame_pos, crops)
+                    continue
+                frame_numbers.append(int(frame_pos))
+                for roi_frames, crop in zip(frames, crops):
+                    roi_frames.append(crop)
+    except BaseException:
+        if cache is not None:
+            writer.abort()
+        raise
+    finally:
+        cap.release()
+    if cache is not None:
+        writer.close()
+        return cache.get(vidx, rois, end_frame)
+    shapes = [(roi[3] - roi[1] + 1, roi[2] - roi[0] + 1) for roi in rois]
+    return np.array(frame_numbers, np.int64), [np.array(roi_frames) if roi_frames else np.empty((0,) + shape, np.uint8)
+                                              for roi_frames, shape in zip(frames, shapes)]
+
+class MotionGate:
+    """
+    This class cheaply decides whether anything has moved in a tank since the last frame that was fully tracked, 
+    so that create_mask and detect_contours can be skipped while the tadpole is still (see skip_idle in track_video). 
+    A frame is idle when fewer than idle_pixels pixels differ by more than idle_diff grey levels from the last fully tracked frame. 
+    Every max_idle frames the tank is fully tracked anyway, so the background subtractor keeps learning.
+
+    Parameters
+    ----------
+    idle_diff: int
+        the change in grey level (0-255) for a pixel to be counted as moving, above the noise of the video
+    idle_pixels: int
+        the number of moving pixels needed for a frame to be tracked
+    max_idle: int
+        the maximum number of idle frames in a row
+    """
+    def __init__(self, idle_diff=25, idle_pixels=10, max_idle=25):
+        self.idle_diff = idle_diff
+        self.idle_pixels = idle_pixels
+        self.max_idle = max_idle
+        self.nidle = 0 #number of idle frames since the last fully tracked frame
+        self.reference = None #greyscale tank in the last fully tracked frame
+        self._gray = None
+
+    def idle(self, frame):
+        """
+        Returns True if frame (the tank container, colour or greyscale) has not changed since the last fully tracked frame.
+        """
+        self._gray = frame if frame.ndim == 2 else cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        if self.reference is None or self.nidle >= self.max_idle:
+            return False
+        diff = cv2.absdiff(self._gray, self.reference)
+        moving = cv2.countNonZero(cv2.threshold(diff, self.idle_diff, 255, cv2.THRESH_BINARY)[1])
+        if moving < self.idle_pixels:
+            self.nidle += 1
+            return True
+        return False
+
+    def update(self):
+        """
+        Call after a frame is fully tracked, so the next frames are compared with it.
+        """
+        self.reference = self._gray
+        self.nidle = 0
+
 def create_mask(frame, subtractor, sub_learn_rate, blur_kernal):
     """
     This function retrieves a video frame and preprocesses it for 
@@ -14,8 +357,8 @@ def create_mask(frame, subtractor, sub_learn_rate, blur_kernal):
 
     Parameters
     ----------
-    frame: ndarray, shape(n_rows, n_cols, 3)
-        source image with 3 colour channels
+    frame: ndarray, shape(n_rows, n_cols, 3) or shape(n_rows, n_cols)
+        source image with 3 colour channels, or already converted to greyscale (eg by FrameReader)
     subtractor: cv2 function
         the type of subtractor used to create mask
     sub_learn_rate: float
@@ -24,8 +367,11 @@ def create_mask(frame, subtractor, sub_learn_rate, blur_kernal):
         array, int
         how many pixels are combined to create the blurred image
     """
-    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-    eq = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    if frame.ndim == 2:
+        gray = frame
+    else:
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    eq = gray #the same greyscale image, it is not blurred or thresholded
     blur = cv2.GaussianBlur(gray, blur_kernal, 0)
     mask = subtractor.apply(blur, learningRate=sub_learn_rate)
     minthresh = 60 
@@ -34,9 +380,12 @@ def create_mask(frame, subtractor, sub_learn_rate, blur_kernal):
     mask = cv2.dilate(mask, None, iterations=3) 
     return mask, blur, eq
 
-def detect_contours(frame, blur, mask, eq, min_area, max_area, prev_x, prev_y, prev_xy):
+def detect_contours(frame, blur, mask, eq, min_area, max_area, prev_x, prev_y, prev_xy, draw=True, offset=(0, 0)):
     """
     This function detects contours (binary mask images), thresholds them based on area and draws them.
+    The contours are found in a single pass and the area of each contour is only calculated once. 
+    The smallest contour between min_area and max_area is the tracked object. 
+    If no contour is found the previous centroid is returned.
 
     Parameters
     ----------
@@ -58,22 +407,29 @@ def detect_contours(frame, blur, mask, eq, min_area, max_area, prev_x, prev_y, p
         previous y contour coordinate
     prev_xy: array, int
         previous xy contour coordinate
+    draw: bool
+        if True contours outside of min_area and max_area are removed from mask and a rectangle is drawn around 
+        the detected contour on frame, blur, mask and eq. 
+        Use False when tracking headless as nothing is displayed
+    offset: array, int
+        whole frame coordinates of the top left corner of the images, when they are a part of the frame (see frame_centre)
 
+    Returns the detected contour (None if no contour was found) and its centroid (cx, cy, cxcy)
     """
-    cnts = cv2.findContours(mask.copy(), cv2.RETR_EXTERNAL,cv2.CHAIN_APPROX_SIMPLE) #finds the contours (outlines) of the binary mask image
+    cnts = cv2.findContours(mask, cv2.RETR_EXTERNAL,cv2.CHAIN_APPROX_SIMPLE) #finds the contours (outlines) of the binary mask image
     cnts = imutils.grab_contours(cnts) #select these contour
-    for c in cnts:
-        area = cv2.contourArea(c)
-        (x, y, w, h) = cv2.boundingRect(c)
-        extent = area / float(w * h)
-        
+    c = None
+    c_area = None
+    for cnt in cnts:
+        area = cv2.contourArea(cnt)
         if area < min_area or area > max_area:
-            cv2.drawContours(mask, [c], -1, 0, -1)
-    mask = cv2.bitwise_and(mask, mask, mask = mask)
-    cnts = cv2.findContours(mask.copy(), cv2.RETR_EXTERNAL,cv2.CHAIN_APPROX_SIMPLE) #finds the contours (outlines) of the binary mask image
-    cnts = imutils.grab_contours(cnts) #select these contour
-    for c in cnts:
-        c = sorted(cnts, key = cv2.contourArea, reverse=True)[-1] 
+            if draw:
+                cv2.drawContours(mask, [cnt], -1, 0, -1) #remove contours which are too small or too big from the mask
+            continue
+        if c is None or area <= c_area: #keep the smallest contour
+            c = cnt
+            c_area = area
+    if c is not None:
         M = cv2.moments(c) #allows calculation of centroid
         if M["m00"] or M["m10"] != 0:
             cx = int(M["m10"] / M["m00"])
@@ -83,26 +439,55 @@ def detect_contours(frame, blur, mask, eq, min_area, max_area, prev_x, prev_y, p
             cx = 0
             cy = 0
             cxcy = (0,0)
-        if cx == 319 and cy == 179:
+        if frame_centre(cxcy, offset):
             cx = 0
             cy = 0
-            cxcy = (319,179)
         prev_x.appendleft(cx)
         prev_y.appendleft(cy)
         prev_xy.appendleft(cxcy)
-        (cx, cy, w, h) = cv2.boundingRect(c) #Define the xy coordinates and width+height of the contour
-        for img in (frame, blur, mask, eq):
-            cv2.rectangle(img, (cx, cy), (cx + w, cy + h), (0, 255, 0), 1) #define colour and shape of rectangle and place on the frame
+        if draw:
+            (x, y, w, h) = cv2.boundingRect(c) #Define the xy coordinates and width+height of the contour
+            for img in (frame, blur, mask, eq):
+                cv2.rectangle(img, (x, y), (x + w, y + h), (0, 255, 0), 1) #define colour and shape of rectangle and place on the frame
     else:
-        for x in prev_x:
-            cx = x
-        for y in prev_y:
-            cy = y
-        for xy in prev_xy:
-            cxcy = xy
-        c = None
+        cx = prev_x[0]
+        cy = prev_y[0]
+        cxcy = prev_xy[0]
     return c, cx, cy, cxcy
 
+class DistanceTravelled:
+    """
+    This class keeps a running total of the distance travelled by the tracked object so that 
+    calculate_distance adds each new distance in constant time instead of summing every previous distance again. 
+    The total is kept in hundredths of a pixel as an integer, so it is exact and gives the same CumulPixelDist 
+    as rounding the sum of all the (2 decimal place) distances.
+
+    Parameters
+    ----------
+    keep_history: bool
+        if True every distance is also stored (newest first) in the deque "history"
+    """
+    def __init__(self, keep_history=False):
+        self.nframes = 0 #number of distances added
+        self.total = 0 #cumulative distance travelled in hundredths of a pixel
+        self.history = deque() if keep_history else None
+
+    def __len__(self):
+        return self.nframes
+
+    def append(self, Pixel_dist):
+        """
+        Add the distance travelled between this frame and the previous frame and return the cumulative distance travelled, 
+        which is 0 until a second distance has been added.
+        """
+        self.nframes += 1
+        self.total += int(round(Pixel_dist * 100))
+        if self.history is not None:
+            self.history.appendleft(Pixel_dist)
+        if self.nframes < 2:
+            return 0
+        return self.total / 100
+
 def calculate_distance(cx, cy, cxpts, cypts, dist_travelled):
     """
     This function calculates the distance the tracked object moves.
@@ -118,8 +503,9 @@ def calculate_distance(cx, cy, cxpts, cypts, dist_travelled):
         A list of all current x centroids from previous frames
     cypts: array, float
         A list of all current y centroids from previous frames
-    dist_travelled: float
-        distance object has moved from this frame and previous frame
+    dist_travelled: DistanceTravelled or deque
+        running total of the distance object has moved between each frame and the previous frame. 
+        A deque of every previous distance is also accepted, the cumulative distance is then the sum of the deque
     """
     #step 1: append xy coordinates to a list
     cxpts.appendleft(cx) #append x coordinates to cxpts list
@@ -152,19 +538,19 @@ def calculate_distance(cx, cy, cxpts, cypts, dist_travelled):
     Pixel_dist = round(Pixel_dist, 2)
 
     #step 4: calculate cumlative distance travelled (in pixels)
-    #append distance travelled calcultions to a list
-    dist_travelled.appendleft(Pixel_dist)
-    #unless otherwise stated cumlative distance travelled = 0
-    cumul_dist_travelled = 0
-    #sum each value found in the dist_travelled list
-    for cumul_dist_travelled in range(1, len(dist_travelled)):
-        cumul_dist_travelled = sum(dist_travelled)
-    #round the value to 2 decimal places
-    cumul_dist_travelled = round(cumul_dist_travelled, 2)
+    if isinstance(dist_travelled, DistanceTravelled):
+        #add the distance travelled to the running total (already to 2 decimal places)
+        cumul_dist_travelled = dist_travelled.append(Pixel_dist)
+    elif isinstance(dist_travelled, deque):
+        #sum every distance travelled so far
+        dist_travelled.appendleft(Pixel_dist)
+        cumul_dist_travelled = round(sum(dist_travelled), 2) if len(dist_travelled) > 1 else 0
+    else:
+        raise TypeError("dist_travelled should be a DistanceTravelled or a deque, not {}".format(type(dist_travelled).__name__))
 
     return ix, iy, Pixel_dist, cumul_dist_travelled
 
-def draw_lines(cxcy, pts, frame, blur, mask):
+def draw_lines(cxcy, pts, frame, blur, mask, offset=(0, 0)):
     """
     This function draws a line between consecutive location the object moves
     
@@ -180,8 +566,10 @@ def draw_lines(cxcy, pts, frame, blur, mask):
         blurred image with 1 colour channel
     mask: ndarray, shape(n_rows, n_cols, 1)
         binarised image with 1 colour channel 
+    offset: array, int
+        whole frame coordinates of the top left corner of the images, when they are a part of the frame (see frame_centre)
     """
-    if cxcy != (319,179):
+    if not frame_centre(cxcy, offset):
         pts.appendleft(cxcy)
     for i in range(1, len(pts)):
             if pts[i - 1] is None or pts[i] is None:
@@ -224,7 +612,7 @@ def HUD_info(frame, blur, mask, eq, line, columnID, frame_pos, cumul_dist_travel
     
     return frame, blur, mask, eq
 
-def output(frame, mask, eq, blur, mode="frame"):
+def output(frame, mask, eq, blur, mode="frame", window="output"):
     """
     This function provides different ways of viewing the output of the tracked object
     
@@ -247,24 +635,42 @@ def output(frame, mask, eq, blur, mode="frame"):
             "frame_blur" : shows tracked object in source image and blurred image
             "blur+eq" : shows tracked object in blurred image and greyscale image
         different modes are useful when diagnosing problems with tracker
+    window: str
+        name of the window the output is shown in (one window per tank when several tanks are tracked)
+    """
+    image = output_image(frame, mask, eq, blur, mode)
+    if image is not None:
+        cv2.imshow(window, image)
+
+def output_image(frame, mask, eq, blur, mode="frame"):
+    """
+    This function makes the image shown by output for each mode (see output), so it can also be written to a video file (see VideoExporter). 
+    Returns None if mode is not one of the output modes.
+
+    Parameters
+    ----------
+    frame, mask, eq, blur: ndarray
+        source, binarised, greyscale and blurred images (see output)
+    mode: str
+        "frame", "mask", "blur", "frame+mask", "frame_blur" or "blur+eq" (see output)
     """
     if mode == "frame":
-        cv2.imshow('output', frame) 
+        return frame
     if mode == "mask":
-        cv2.imshow('output', mask) 
+        return mask
     if mode == "blur":
-        cv2.imshow('output', blur)
+        return blur
     if mode == "frame+mask":
         frame_plus_mask = cv2.bitwise_and(frame, frame, mask=mask)
-        hstack_frame_plus_mask = np.hstack((frame, frame_plus_mask))
-        cv2.imshow("output", hstack_frame_plus_mask)
+        return np.hstack((frame, frame_plus_mask))
     if mode == "frame_blur":
         blur_2_colour = cv2.cvtColor(blur, cv2.COLOR_GRAY2BGR)
-        hstack_frame_blur = np.hstack((frame, blur_2_colour))
-        cv2.imshow('output', hstack_frame_blur)
+        return np.hstack((frame, blur_2_colour))
     if mode == "blur+eq":
-        hstack_gray_plus_eq = np.hstack((blur, eq))
-        cv2.imshow("output", hstack_gray_plus_eq)
+        return np.hstack((blur, eq))
+    return None
+
+output_modes = ("frame", "mask", "blur", "frame+mask", "frame_blur", "blur+eq") #modes of output_image
 
 
 def frame_display_time(fps, mode = "nat_speed"):
@@ -302,13 +708,496 @@ def frame_display_time(fps, mode = "nat_speed"):
         key = cv2.waitKey(slow_speed) & 0xFF
     return key
 
+TrackRecord = namedtuple("TrackRecord", ("frame", "cx", "cy", "dx", "dy", "step", "cumulative")) #results of one frame, in the order of the results file columns
 
-    
+class Tracker:
+    """
+    This class tracks the tadpole in one tank container, one frame at a time, with its own background subtractor and lists. 
+    track() runs create_mask -> detect_contours -> calculate_distance on a frame and returns a TrackRecord 
+    (frame number, centroid in whole frame coordinates, distance moved in x and y, distance moved and cumulative distance), 
+    and stream() does the same lazily for every frame of a frame source, passing each record to any sinks (eg a results writer or display). 
+    After each frame the images (mask, blur, eq), contour (None if no tadpole was found) and centroid (cxcy) of the frame are kept 
+    so they can be drawn or displayed, all in tank container coordinates. 
+    Each frame is tracked with a border of zeros (margin) around the tank container, so that blurring and dilating the mask 
+    near the tank walls gives the same contours as tracking the whole frame with everything outside the tank set to 0. 
+    For example, to track the left tank of a video without writing any files:
+        for record in Tracker(roi).stream(tank_frames(vidx, roi)):
+            print(record.frame, record.cx, record.cy, record.cumulative)
 
+    Parameters
+    ----------
+    roi: array, int
+        tank container rectangle (see tank_roi), to map the centroids back to whole frame coordinates
+    sub_varThreshold, sub_learn_rate, blur_kernal, min_area, max_area:
+        tracker settings (see track_video)
+    sub_history: int
+        how many prior frames the background subtractor uses to determine stationary objects
+    skip_idle: bool
+        if True frames where nothing has moved since the last tracked frame are not tracked (see MotionGate)
+    idle_diff, idle_pixels: int
+        motion settings used when skip_idle is True (see MotionGate)
+    frame_step: int
+        the number of video frames between the frames tracked (see video_frames). When more than 1, DistX, DistY and PixelDist 
+        are divided by frame_step so they are still per video frame, and the cumulative distance is the length of the path between the frames tracked
+    draw: bool
+        if True contours outside min_area and max_area are removed from the mask and a rectangle is drawn around 
+        the tadpole on the frame and images (see detect_contours)
+    timer: StageTimer
+        records the time spent in each stage (see Tracking_profiler.py)
+    """
+    def __init__(self, roi, sub_varThreshold=150, sub_learn_rate=-1, blur_kernal=(1,1), min_area=100, max_area=900,
+                 sub_history=100, skip_idle=False, idle_diff=25, idle_pixels=10, frame_step=1, draw=False, timer=None):
+        self.roi = roi
+        self.margin = 3 + max(blur_kernal) // 2 #the mask is dilated 3 times and blurred by blur_kernal
+        self._offset = (roi[0] - self.margin, roi[1] - self.margin) #whole frame coordinates of the top left corner of the padded frame
+        self.sub_learn_rate = sub_learn_rate
+        self.blur_kernal = blur_kernal
+        self.min_area = min_area
+        self.max_area = max_area
+        self.frame_step = frame_step
+        self.draw = draw
+        self.timer = timer if timer is not None else StageTimer(enabled=False)
+        #set up a list to store a single x y point at a time.
+        self.prev_x = deque([0], maxlen=1)
+        self.prev_y = deque([0], maxlen=1)
+        self.prev_xy = deque([None], maxlen=1)
+        #list of points to follow detected object movement (contails)
+        self.pts = deque(maxlen=100) #maxlen = object location in previous x frames
+        #list of points to calculate distance between consecutive cx and cy points
+        self.cxpts = deque(maxlen=2) #maxlen = 2. Only hold current object X position and last object X position
+        self.cypts = deque(maxlen=2) #maxlen = 2. Only hold current object Y position and last object Y position
+        #set up running total to calculate cumulative distance travelled:
+        self.dist_travelled = DistanceTravelled()
+        ##Define the background subtraction method to be used - each tank keeps its own background model
+        self.subtractor = cv2.createBackgroundSubtractorMOG2(history=sub_history, varThreshold=sub_varThreshold, detectShadows=False)
+        ##skip the frames where nothing moves in the tank
+        self.gate = MotionGate(idle_diff, idle_pixels) if skip_idle else None
+        self.mask = self.blur = self.eq = None #images of the last frame
+        self.cxcy = None #centroid of the last frame, in tank container coordinates (the lists prev_x, prev_y and prev_xy are in padded frame coordinates)
+        self.contour = None #contour of the tadpole in the last tracked frame
+        self._images = None
 
-    
+    def warm(self, frame):
+        """
+        Train the background subtractor on a frame without tracking it (eg the frames before a checkpoint, see track_video).
+        """
+        create_mask(self._pad(frame), self.subtractor, self.sub_learn_rate, self.blur_kernal)
 
+    def _pad(self, frame):
+        m = self.margin
+        return cv2.copyMakeBorder(frame, m, m, m, m, cv2.BORDER_CONSTANT, value=0)
 
+    def _unpad(self, cxcy):
+        #padded frame -> tank container coordinates
+        return None if cxcy is None else (cxcy[0] - self.margin, cxcy[1] - self.margin)
 
-        
-        
\ No newline at end of file
+    def track(self, frame, frame_pos):
+        """
+        Track the tadpole in one frame (the tank container, colour or greyscale) and return its TrackRecord.
+        """
+        timer = self.timer
+        gate = self.gate
+        if gate is not None and gate.idle(frame):
+            #nothing has moved since the last tracked frame: carry the last centroid forward (a distance of 0)
+            cx, cy, self.cxcy = self.cxpts[0], self.cypts[0], self._unpad(self.prev_xy[0])
+            if self.draw:
+                self.mask, self.blur, self.eq = (img.copy() for img in self._images) #show the images of the last tracked frame
+            timer.lap("motion_gate")
+        else:
+            if gate is not None:
+                timer.lap("motion_gate")
+            m = self.margin
+            padded = self._pad(frame)
+            mask, blur, eq = create_mask(padded, self.subtractor, self.sub_learn_rate, self.blur_kernal)
+            timer.lap("create_mask")
+
+            self.mask, self.blur, self.eq = (img[m:-m, m:-m] for img in (mask, blur, eq)) #the tank container without the border
+            if gate is not None:
+                gate.update() #compare the next frames with this frame
+                if self.draw:
+                    self._images = (self.mask.copy(), self.blur.copy(), self.eq.copy())
+            contour, cx, cy, cxcy = detect_contours(padded, blur, mask, eq, self.min_area, self.max_area, self.prev_x, self.prev_y, self.prev_xy,
+                                                    draw=self.draw, offset=self._offset)
+            if self.draw:
+                frame[:] = padded[m:-m, m:-m] #the rectangle drawn around the tadpole
+            cx, cy = roi_to_frame(cx, cy, self.roi, m) #results are written in whole frame coordinates
+            self.contour = contour - m if contour is not None else None
+            self.cxcy = self._unpad(cxcy)
+            timer.lap("detect_contours")
+        ix, iy, Pixel_dist, cumul_dist_travelled = calculate_distance(cx, cy, self.cxpts, self.cypts, self.dist_travelled)
+        if self.frame_step > 1:
+            #the distance moved per video frame between the frames tracked
+            ix, iy, Pixel_dist = (round(dist / self.frame_step, 2) for dist in (ix, iy, Pixel_dist))
+        timer.lap("calculate_distance")
+        return TrackRecord(int(frame_pos), cx, cy, ix, iy, Pixel_dist, cumul_dist_travelled)
+
+    def stream(self, frames, sinks=()):
+        """
+        Track every frame of frames, an iterable of (frame_pos, frame) pairs (see tank_frames), yielding the TrackRecord of each frame as it is tracked. 
+        Each sink is called with (record, tracker) after every frame, eg ResultsWriter.write_record or a function that displays tracker.mask.
+        """
+        for frame_pos, frame in frames:
+            record = self.track(frame, frame_pos)
+            for sink in sinks:
+                sink(record, self)
+            yield record
+
+def video_frames(vidx, rois=None, end_frame=None, frame_step=1, cache=None, start_frame=1):
+    """
+    This function reads a video lazily, yielding (frame_pos, frame) for every frame_step-th frame from the frame after start_frame up to end_frame. 
+    If rois are given, frame is a list of the greyscale tank container of each roi (read from the cache if one is given), 
+    otherwise it is the colour frame. The video is decoded on a background thread (see FrameReader).
+
+    Parameters
+    ----------
+    vidx: str
+        location of the video file
+    rois: list
+        tank container rectangles (see tank_roi)
+    end_frame: int
+        the last frame to read, by default 10 mins of video
+    frame_step: int
+        only every frame_step-th frame is read
+    cache: FrameCache
+        cache of decoded frames, only used with rois (see Tracking_cache.py)
+    start_frame: int
+        frames are read from the frame after start_frame. 1 = the first frame tracked by Track_Tadpole.py
+    """
+    cap = cv2.VideoCapture(vidx) #object "cap".  Use cv2.videocapture to read the frames in a video
+    if not cap.isOpened():
+        raise IOError("could not open video {}".format(vidx))
+    if end_frame is None:
+        end_frame = int(600*int(cap.get(cv2.CAP_PROP_FPS))) #10 mins in secs * number of frames per second (fps)
+    if rois is not None and cache is not None:
+        cap.release()
+        #read the greyscale tank containers from the frame cache (decoding the video into the cache if it is not there yet)
+        frame_numbers, roi_frames = read_roi_frames(vidx, rois, end_frame, cache)
+        first = int(np.searchsorted(frame_numbers, start_frame + 1)) #the cache starts at the first frame of the video
+        for i in range(first, len(frame_numbers), frame_step):
+            yield frame_numbers[i], [tank_frames[i] for tank_frames in roi_frames]
+        return
+    cap.set(1,start_frame)
+    reader = FrameReader(cap, end_frame, rois, frame_step=frame_step)
+    try:
+        for frame_pos, frame, crops in reader:
+            yield frame_pos, crops if rois is not None else frame
+    finally:
+        reader.close() #stop decoding before the video is released
+        cap.release()
+
+def tank_frames(vidx, roi, **kwargs):
+    """
+    This function reads the greyscale tank container of one roi from every frame of a video lazily, yielding (frame_pos, frame) pairs for Tracker.stream. 
+    kwargs are passed on to video_frames (end_frame, frame_step, cache, start_frame).
+
+    Parameters
+    ----------
+    vidx: str
+        location of the video file
+    roi: array, int
+        tank container rectangle (see tank_roi)
+    """
+    for frame_pos, crops in video_frames(vidx, [roi], **kwargs):
+        yield frame_pos, crops[0]
+
+def track_video(vidx, tank_lines, sub_varThreshold, sub_learn_rate, blur_kernal, min_area, max_area,
+                results_dir="Tracking_files", headless=False, results_format="txt", profile=False, cache_dir=None, cache_gb=20,
+                checkpoint_every=0, resume=False, frame_step=1, skip_idle=False, idle_diff=25, idle_pixels=10,
+                export_video=False, export_mode="frame", export_every=1, export_scale=1.0):
+    """
+    This function tracks every tank listed for one video, decoding the video once. 
+    Each tank keeps its own background subtractor and lists and writes its own results file
+    (results_dir/ACT_tadpoleID_trial.txt, or .npz/.parquet). 
+    Returns a summary of the job: the video, the results files written, the number of frames tracked and the time taken.
+
+    Parameters
+    ----------
+    vidx: str
+        location of the video file
+    tank_lines: list
+        lines of ACT_video_info.txt split into columns, one for each tank tracked in this video (see group_by_video)
+    sub_varThreshold: int
+        the pixel threshold value to be counted as a "moving tadpole" object
+    sub_learn_rate: float
+        the rate at which the subtractor learns what is a stationary vs moving object
+    blur_kernal: array, int
+        how many pixels are combined to create the blurred image
+    min_area: int
+        the minimum area a contour should be to considered a tadpole
+    max_area: int
+        the maximum area a contour should be to considered a tadpole
+    results_dir: str
+        folder where the results files are stored
+    headless: bool
+        if False the tracking windows are shown and "q" skips the video. 
+        If True nothing is drawn or displayed and there is no waitKey pause between frames, 
+        only mask -> contours -> distance -> results are run (for servers with no display and worker processes, see run_batch)
+    results_format: str
+        format of the results files, "txt" (tab separated), "npz" (compressed numpy) or "parquet" (see ResultsWriter)
+    profile: bool
+        if True the time spent in each stage of the tracking loop is recorded for every frame. 
+        At the end of the video a summary is printed and saved to results_dir/profile_videoname_tadpoles_hash.json (see Tracking_profiler.py)
+    cache_dir: str
+        if given (and headless), the greyscale tank containers are read from the frame cache in this folder, 
+        and the video is decoded into the cache the first time it is tracked (see Tracking_cache.py)
+    cache_gb: float
+        the maximum size of the frame cache in gigabytes
+    checkpoint_every: int
+        if more than 0, the state of every tank and the rows written to the results files are saved every checkpoint_every frames 
+        (and when the video is finished or skipped) to results_dir/checkpoint_videoname_tadpoles_hash.json (see Tracking_checkpoint.py). 
+        When the video is tracked from the start an old checkpoint is deleted
+    resume: bool
+        if True and the video has a checkpoint with the same results files and settings, a finished video is skipped and 
+        an unfinished video carries on from the frame after the checkpoint. The background subtractor is re-trained on the 
+        frames before the checkpoint (sub_history frames) and the txt results files are cut back to the checkpoint and added to
+    frame_step: int
+        only every frame_step-th frame is tracked and written to the results files (1 = every frame). 
+        FrameNo is still the frame number in the video. DistX, DistY and PixelDist are the distance moved per video frame 
+        (the distance since the last frame tracked divided by frame_step) and CumulPixelDist is the length of the path between the frames tracked
+    skip_idle: bool
+        if True, frames where nothing has moved in a tank since the last tracked frame (see MotionGate) are not tracked: 
+        the last centroid is carried forward with a distance of 0, and a line is still written to the results file for every frame
+    idle_diff: int
+        the change in grey level for a pixel to be counted as moving when skip_idle is True
+    idle_pixels: int
+        the number of moving pixels needed for a frame to be tracked when skip_idle is True
+    export_video: bool
+        if True the annotated tracking images of each tank (trail, rectangle around the tadpole and HUD) are written to 
+        results_dir/ACT_tadpoleID_trial.mp4 on a background thread (see VideoExporter), also when headless. 
+        When headless the decoded colour frames are used instead of the frame cache
+    export_mode: str
+        the images exported: "frame" = the whole annotated frame, or one of the other modes of output (eg "frame+mask") for the tank container
+    export_every: int
+        only every export_every-th tracked frame is exported
+    export_scale: float
+        the exported images are resized by this factor (eg 0.5 = half the width and height)
+    """
+    if export_video and export_mode not in output_modes:
+        raise ValueError("export_mode should be one of {}, not {!r}".format(', '.join(output_modes), export_mode))
+    start = time.perf_counter()
+    settings = {"sub_varThreshold": sub_varThreshold, "sub_learn_rate": sub_learn_rate, "blur_kernal": blur_kernal,
+                "min_area": min_area, "max_area": max_area, "frame_step": frame_step, "skip_idle": skip_idle}
+    sub_history = 100 #keep at 500 - how many prior frames are used to determine stationary objects
+
+    ##check whether this video has already been (partly) tracked
+    tadpoles = ['_'.join((line[TadpoleID], line[TrialID])) for line in tank_lines]
+    checkpoint_json = checkpoint_path(results_dir, vidx, tadpoles)
+    results_paths = [os.path.join(results_dir, '_'.join(('ACT', line[TadpoleID], line[TrialID]))) + suffixes[results_format] for line in tank_lines]
+    checkpoint = load_checkpoint(checkpoint_json, vidx, results_paths, settings) if resume else None
+    if checkpoint is not None and checkpoint["complete"]:
+        return {"video": vidx, "results": results_paths, "frames": 0, "seconds": time.perf_counter() - start, "skipped": True}
+    if checkpoint is not None and results_format != "txt":
+        checkpoint = None #only txt results files can be added to, track the video again
+    resume_frame = checkpoint["frame"] if checkpoint is not None else 0 #frames up to resume_frame are already in the results files
+
+    cap = cv2.VideoCapture(vidx) #object "cap".  Use cv2.videocapture to read the frames in a video
+    if not cap.isOpened():
+        raise IOError("could not open video {}".format(vidx))
+    fps = int(cap.get(cv2.CAP_PROP_FPS)) #determines number of frames per second in video
+    cap.release()
+    end_frame = int(600*fps) #end frame = 15mins in secs (60*15 = 900secs) * number of frames per second (fps)
+    timer = StageTimer(enabled=profile) #time spent in each stage of the tracking loop
+
+    if checkpoint is None and os.path.exists(checkpoint_json):
+        os.remove(checkpoint_json) #the results files are started again, so an old checkpoint no longer describes them
+
+    ##set up one tracker (results file, lists and background subtractor) for each tank in this video
+    tanks = []
+    for i, line in enumerate(tank_lines):
+        roi = tank_roi(line) #the tadpole container on the left or right - only these pixels are tracked
+
+        ##set up the conditions required for the .txt files where the results will be stored
+        results_fn = ('_'.join(('ACT', line[TadpoleID], line[TrialID]))) #name file ACT_tadpoleID_trial according to cooresponding lines in inputted .txt file
+        #the results are stored in blocks and written to results_dir/ACT_tadpoleID_trial + the suffix of the results format
+        myresults = ResultsWriter(os.path.join(results_dir, results_fn), line[TadpoleID], line[TrialID], results_format,
+                                  resume=checkpoint["tanks"][i]["results_offset"] if checkpoint is not None else None, frame_step=frame_step)
+
+        #each tank keeps its own background subtractor and lists
+        tracker = Tracker(roi, sub_varThreshold, sub_learn_rate, blur_kernal, min_area, max_area, sub_history,
+                          skip_idle, idle_diff, idle_pixels, frame_step, draw=not headless, timer=timer)
+        if checkpoint is not None:
+            restore_tank(tracker, checkpoint["tanks"][i]) #carry on from the lists and distance saved in the checkpoint
+        #write the annotated images to a video
+        exporter = VideoExporter(os.path.join(results_dir, results_fn + '.mp4'), fps, export_every, export_scale) if export_video else None
+        tanks.append({"line": line, "roi": roi, "tracker": tracker, "myresults": myresults, "exporter": exporter})
+
+    #when resuming, start sub_history tracked frames before the checkpoint to re-train the background subtractors
+    start_pos = 1 + max(0, (resume_frame - 2) // frame_step - sub_history + 1) * frame_step if resume_frame else 1
+    nframes = 0 #number of frames tracked
+    last_frame = resume_frame #the last frame tracked
+    complete = False #True when every frame up to end_frame has been tracked
+    tracked = False #True when the tracking loop has finished without an error
+
+    #decode the video on a background thread. When headless the decoder also crops each tank and converts it to greyscale
+    #(or the tanks are read from the frame cache). Exporting the tracking needs the colour frames
+    crop = headless and not export_video
+    frames = video_frames(vidx, [tank["roi"] for tank in tanks] if crop else None, end_frame, frame_step,
+                          FrameCache(cache_dir, cache_gb) if cache_dir else None, start_pos)
+    timer.start()
+    try:
+        for frame_pos, frame in frames:
+            timer.lap("decode")
+            if frame_pos <= resume_frame:
+                #re-train the background subtractors on the frames before the checkpoint, these frames are already in the results files
+                for i, tank in enumerate(tanks):
+                    tank["tracker"].warm(frame[i] if crop else crop_roi(frame, tank["roi"]))
+                timer.lap("create_mask")
+                timer.next_frame()
+                continue
+            nframes += 1
+
+            #the decoded frame is shared by every tank in this video
+            for i, tank in enumerate(tanks):
+                line = tank["line"]
+                tracker = tank["tracker"]
+                if crop:
+                    roi_frame = frame[i] #ROI = this tank's tadpole
+                elif headless:
+                    roi_frame = crop_roi(frame, tank["roi"]) #nothing is drawn on the frame
+                else:
+                    tank_frame = frame.copy() #each tank draws its own tracking lines and information
+                    roi_frame = crop_roi(tank_frame, tank["roi"])
+                timer.lap("roi")
+
+                record = tracker.track(roi_frame, frame_pos)
+                tank["myresults"].write_record(record) #store results for the results file
+                timer.lap("write")
+
+                if not headless:
+                    mask, blur, eq = tracker.mask, tracker.blur, tracker.eq
+                    tracker.pts = draw_lines(tracker.cxcy, tracker.pts, roi_frame, blur, mask, tracker.roi)
+                    timer.lap("draw_lines")
+                    tank_frame, blur, mask, eq = HUD_info(tank_frame, blur, mask, eq, line, TadpoleID, frame_pos, record.cumulative)
+                    timer.lap("HUD_info")
+
+                    print(line[TadpoleID], record.cx, record.cy)
+                    window = '_'.join(('ACT', line[TadpoleID], line[TrialID])) #one window per tank
+                    output(roi_frame, mask, blur, eq, mode="frame+new_mask", window='output_' + window)
+                    cv2.imshow('tadpole_tracker_' + window, tank_frame)
+                    timer.lap("output")
+
+                exporter = tank["exporter"]
+                if exporter is not None:
+                    if exporter.want_frame():
+                        if headless:
+                            #annotate a copy of this frame, only for the frames exported
+                            tank_frame = frame.copy()
+                            roi_frame = crop_roi(tank_frame, tank["roi"])
+                            mask, blur, eq = tracker.mask.copy(), tracker.blur.copy(), tracker.eq.copy()
+                            if tracker.contour is not None:
+                                (x, y, w, h) = cv2.boundingRect(tracker.contour)
+                                cv2.rectangle(roi_frame, (x, y), (x + w, y + h), (0, 255, 0), 1)
+                            tracker.pts = draw_lines(tracker.cxcy, tracker.pts, roi_frame, blur, mask, tracker.roi)
+                            tank_frame, blur, mask, eq = HUD_info(tank_frame, blur, mask, eq, line, TadpoleID, frame_pos, record.cumulative)
+                        exporter.write(tank_frame if export_mode == "frame" else output_image(roi_frame, mask, eq, blur, export_mode))
+                    elif headless and not frame_centre(tracker.cxcy, tracker.roi):
+                        tracker.pts.appendleft(tracker.cxcy) #keep the trail of the frames not exported (see draw_lines)
+                    timer.lap("export")
+
+            last_frame = frame_pos
+            if not headless:
+                key = frame_display_time(fps, mode="fast_speed")
+                timer.lap("output")
+                ##To skip a video press:
+                if key == ord('q'):
+                    timer.next_frame()
+                    break
+            timer.next_frame()
+            if checkpoint_every and nframes % checkpoint_every == 0:
+                save_checkpoint(checkpoint_json, vidx, tanks, last_frame, settings)
+        else:
+            complete = True
+        if checkpoint_every or resume:
+            save_checkpoint(checkpoint_json, vidx, tanks, last_frame, settings, complete)
+        tracked = True
+    finally:
+        #close files and windows after analysis is complete
+        frames.close() #stop decoding and release the video
+        if not headless:
+            cv2.destroyAllWindows() #destroy any video windows open
+        for tank in tanks:
+            tank["myresults"].close() #close the file when a video is finished or no more videos are playing
+        export_errors = []
+        for tank in tanks:
+            if tank["exporter"] is not None:
+                try:
+                    tank["exporter"].close() #encode the last images
+                except Exception as error:
+                    export_errors.append(error) #close the other exporters first
+        if export_errors and tracked:
+            raise export_errors[0] #an error raised while tracking is not replaced by the export error
+
+    if profile:
+        summary = timer.summary()
+        print_summary(summary, vidx)
+        profile_json = os.path.join(results_dir, 'profile_' + job_name(vidx, tadpoles) + '.json')
+        save_summary(summary, profile_json, video=vidx, tanks=tadpoles,
+                     headless=headless, opencv=cv2.__version__,
+                     settings=settings)
+
+    return {"video": vidx, "results": [tank["myresults"].path for tank in tanks],
+            "frames": nframes, "seconds": time.perf_counter() - start, "resumed_from": resume_frame}
+
+def _init_worker():
+    """
+    This function runs once in each worker process of run_batch. 
+    OpenCV is limited to one thread per worker so that the workers do not compete for the same cores.
+    """
+    cv2.setNumThreads(1)
+
+def run_batch(videos, workers=1, headless=False, **settings):
+    """
+    This function tracks a batch of videos, either one at a time in this process (workers=1)
+    or by sending each video job to a pool of worker processes (workers>1, always headless).
+    Each job writes its own results files.  
+    Success or failure and the frames per second are printed for each job as it finishes, followed by the throughput of the whole batch.
+    Returns a list of job summaries (see track_video), with the error message of any job which failed under "error".
+
+    Parameters
+    ----------
+    videos: list
+        (video location, tank lines) jobs, as returned by group_by_video
+    workers: int
+        the number of videos tracked in parallel
+    headless: bool
+        if True no tracking windows are shown and nothing is drawn (see track_video)
+    settings: 
+        the tracker settings passed on to track_video (sub_varThreshold, sub_learn_rate, blur_kernal, min_area, max_area, results_dir, results_format, profile,
+        cache_dir, cache_gb, checkpoint_every, resume)
+    """
+    start = time.perf_counter()
+    jobs = []
+
+    def report(vidx, tank_lines, job):
+        tadpoles = ','.join('_'.join((line[TadpoleID], line[TrialID])) for line in tank_lines)
+        if "error" in job:
+            print("FAILED", vidx, tadpoles, job["error"], sep='\t')
+        elif job.get("skipped"):
+            print("DONE", vidx, tadpoles, "already tracked (checkpoint)", sep='\t')
+        else:
+            print("OK", vidx, tadpoles, "{} frames in {:.1f}s ({:.1f} fps)".format(job["frames"], job["seconds"], job["frames"] / max(job["seconds"], 1e-9)), sep='\t')
+        jobs.append(job)
+
+    if workers <= 1:
+        for vidx, tank_lines in videos:
+            try:
+                job = track_video(vidx, tank_lines, headless=headless, **settings)
+            except Exception as error:
+                job = {"video": vidx, "error": repr(error)}
+            report(vidx, tank_lines, job)
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+            futures = {pool.submit(track_video, vidx, tank_lines, headless=True, **settings): (vidx, tank_lines) for vidx, tank_lines in videos}
+            for future in as_completed(futures):
+                vidx, tank_lines = futures[future]
+                try:
+                    job = future.result()
+                except Exception as error:
+                    job = {"video": vidx, "error": repr(error)}
+                report(vidx, tank_lines, job)
+
+    seconds = time.perf_counter() - start
+    frames = sum(job.get("frames", 0) for job in jobs)
+    failed = sum("error" in job for job in jobs)
+    print("{} of {} jobs tracked, {} failed: {} frames in {:.1f}s ({:.1f} fps)".format(len(jobs) - failed, len(jobs), failed, frames, seconds, frames / max(seconds, 1e-9)))
+    return jobs
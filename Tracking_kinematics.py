@@ -0,0 +1,181 @@
+import glob
+import os
+import numpy as np
+
+
+def load_results(results_txt):
+    """
+    This function reads the frame number and centroids of a results file written by the Tadpole Tracker
+    (Tracking_files/ACT_tadpoleID_trial.txt, .npz or .parquet) so that the movement measures can be recomputed without tracking the video again.
+    Returns three arrays: frame, cx, cy
+
+    Parameters
+    ----------
+    results_txt: str
+        location of the results file
+    """
+    if results_txt.endswith('.npz'):
+        with np.load(results_txt) as track:
+            return track['FrameNo'], track['Xcentroid'], track['Ycentroid']
+    if results_txt.endswith('.parquet'):
+        import pyarrow.parquet
+        track = pyarrow.parquet.read_table(results_txt, columns=['FrameNo', 'Xcentroid', 'Ycentroid'])
+        return tuple(track.column(column).to_numpy() for column in ('FrameNo', 'Xcentroid', 'Ycentroid'))
+    track = np.loadtxt(results_txt, skiprows=1, usecols=(2, 3, 4), dtype=np.int64, ndmin=2) #FrameNo, Xcentroid, Ycentroid columns
+    return track[:, 0], track[:, 1], track[:, 2]
+
+def step_distances(cx, cy):
+    """
+    This function calculates the distance travelled between consecutive points of a whole track in one pass.
+    It follows the same rules as calculate_distance in Tracking_functions.py, so gives the same DistX, DistY, PixelDist and CumulPixelDist columns:
+    a centroid of 0 means no object was found, and the step to or from a 0 centroid is 0 (x and y are treated separately).
+    Returns four arrays: ix, iy, Pixel_dist, cumul_dist_travelled
+
+    Parameters
+    ----------
+    cx: ndarray, int
+        x centroid of the tracked object in each frame
+    cy: ndarray, int
+        y centroid of the tracked object in each frame
+    """
+    cx = np.asarray(cx, dtype=np.int64)
+    cy = np.asarray(cy, dtype=np.int64)
+    #calculate the distance between consecutive x and y points (previous - current), 0 if either point is missing
+    ix = np.zeros(len(cx), np.int64)
+    iy = np.zeros(len(cy), np.int64)
+    ix[1:] = np.where((cx[1:] == 0) | (cx[:-1] == 0), 0, cx[:-1] - cx[1:])
+    iy[1:] = np.where((cy[1:] == 0) | (cy[:-1] == 0), 0, cy[:-1] - cy[1:])
+    #calculate distance travelled between two points (in hundredths of a pixel, so the cumulative sum is exact)
+    Pixel_dist = np.rint(np.sqrt(ix * ix + iy * iy) * 100).astype(np.int64)
+    cumul_dist_travelled = np.cumsum(Pixel_dist)
+    cumul_dist_travelled[:1] = 0 #cumulative distance is 0 in the first frame
+    return ix, iy, Pixel_dist / 100, cumul_dist_travelled / 100
+
+def find_bouts(active, min_bout=1):
+    """
+    This function finds the bouts of activity (runs of consecutive active frames) in a track.
+    Returns two arrays: the index of the first frame of each bout and the number of frames in each bout
+
+    Parameters
+    ----------
+    active: ndarray, bool
+        True for each frame where the object is moving
+    min_bout: int
+        the minimum number of consecutive active frames to be counted as a bout
+    """
+    edges = np.diff(np.concatenate(([0], np.asarray(active, dtype=np.int8), [0])))
+    starts = np.flatnonzero(edges == 1)
+    lengths = np.flatnonzero(edges == -1) - starts
+    keep = lengths >= min_bout
+    return starts[keep], lengths[keep]
+
+def track_kinematics(frame, cx, cy, fps):
+    """
+    This function calculates the movement of the tracked object in every frame of a whole track in one vectorised pass.
+    Returns a dictionary of arrays: FrameNo, Xcentroid, Ycentroid, DistX, DistY, PixelDist, CumulPixelDist and Speed (pixels per second).
+    Speed uses the number of frames between consecutive points, so tracks with skipped frames still give speeds per second. 
+    In tracks with skipped frames DistX, DistY and PixelDist are per video frame, as in the results files (see frame_step in Track_Tadpole.py).
+
+    Parameters
+    ----------
+    frame: ndarray, int
+        frame number of each point of the track
+    cx: ndarray, int
+        x centroid of the tracked object in each frame (0 = no object found)
+    cy: ndarray, int
+        y centroid of the tracked object in each frame (0 = no object found)
+    fps: float
+        number of frames per second in the video
+    """
+    frame = np.asarray(frame, dtype=np.int64)
+    ix, iy, Pixel_dist, cumul_dist_travelled = step_distances(cx, cy)
+    frame_step = np.ones(len(frame), np.int64)
+    frame_step[1:] = np.maximum(np.diff(frame), 1)
+    speed = Pixel_dist * fps / frame_step
+    if (frame_step > 1).any():
+        ix, iy, Pixel_dist = (np.round(dist / frame_step, 2) for dist in (ix, iy, Pixel_dist))
+    return {"FrameNo": frame, "Xcentroid": np.asarray(cx), "Ycentroid": np.asarray(cy), "DistX": ix, "DistY": iy,
+            "PixelDist": Pixel_dist, "CumulPixelDist": cumul_dist_travelled, "Speed": speed}
+
+def track_summary(frame, cx, cy, fps, active_dist=1.5, min_bout=3):
+    """
+    This function summarises the movement of the tracked object over a whole track.
+    Returns a dictionary of: frames, missing_frames (no object found), total_dist (pixels), time_tracked (s),
+    time_active (s), prop_active, max_speed and mean_active_speed (pixels per second), bouts and mean_bout_time (s).
+
+    Parameters
+    ----------
+    frame: ndarray, int
+        frame number of each point of the track
+    cx: ndarray, int
+        x centroid of the tracked object in each frame (0 = no object found)
+    cy: ndarray, int
+        y centroid of the tracked object in each frame (0 = no object found)
+    fps: float
+        number of frames per second in the video
+    active_dist: float
+        the object is active in frames where it moves more than this distance in pixels per frame.
+        The default ignores single pixel (and diagonal pixel) steps caused by jitter of the centroid
+    min_bout: int
+        the minimum number of consecutive active frames (points) to be counted as a bout of activity
+    """
+    kinematics = track_kinematics(frame, cx, cy, fps)
+    frames = len(kinematics["FrameNo"])
+    #number of video frames each point stands for (more than 1 when only every few frames were tracked)
+    frame_step = np.ones(frames, np.int64)
+    frame_step[1:] = np.maximum(np.diff(kinematics["FrameNo"]), 1)
+    video_frames = np.concatenate(([0], np.cumsum(frame_step)))
+    missing = (kinematics["Xcentroid"] == 0) | (kinematics["Ycentroid"] == 0)
+    active = kinematics["Speed"] > active_dist * fps
+    starts, lengths = find_bouts(active, min_bout)
+    lengths = video_frames[starts + lengths] - video_frames[starts] #length of each bout in video frames
+    return {"frames": frames,
+            "missing_frames": int(missing.sum()),
+            "total_dist": float(kinematics["CumulPixelDist"][-1]) if frames else 0.0,
+            "time_tracked": int(video_frames[-1]) / fps,
+            "time_active": int(frame_step[active].sum()) / fps,
+            "prop_active": float(active.mean()) if frames else 0.0,
+            "max_speed": float(kinematics["Speed"].max()) if frames else 0.0,
+            "mean_active_speed": float(kinematics["Speed"][active].mean()) if active.any() else 0.0,
+            "bouts": len(starts),
+            "mean_bout_time": float(lengths.mean()) / fps if len(lengths) else 0.0}
+
+def summarise_results(results_files, fps, active_dist=1.5, min_bout=3):
+    """
+    This function recomputes the movement summary (see track_summary) of many results files without tracking the videos again.
+    Returns a list of (results file name, summary) pairs
+
+    Parameters
+    ----------
+    results_files: list
+        locations of the results files
+    fps: float
+        number of frames per second in the videos
+    active_dist: float
+        the object is active in frames where it moves more than this distance in pixels per frame
+    min_bout: int
+        the minimum number of consecutive active frames to be counted as a bout of activity
+    """
+    summaries = []
+    for results_txt in results_files:
+        frame, cx, cy = load_results(results_txt)
+        summaries.append((os.path.basename(results_txt), track_summary(frame, cx, cy, fps, active_dist, min_bout)))
+    return summaries
+
+
+if __name__ == "__main__":
+    #information to change
+    results_dir = 'Tracking_files' #folder containing the results files
+    fps = 25 #number of frames per second in the videos
+    active_dist = 1.5 #the tadpole is active in frames where it moves more than this many pixels
+    min_bout = 3 #minimum number of consecutive active frames in a bout of activity
+    summary_txt = os.path.join(results_dir, 'ACT_summary.txt') #file where the summary of every results file is written
+
+    results_files = sorted(f for f in glob.glob(os.path.join(results_dir, 'ACT_*.*')) if f != summary_txt and f.endswith(('.txt', '.npz', '.parquet')))
+    summaries = summarise_results(results_files, fps, active_dist, min_bout)
+    with open(summary_txt, 'w') as mysummary:
+        columns = list(summaries[0][1]) if summaries else []
+        print('File', *columns, sep='\t', file=mysummary)
+        for results_fn, summary in summaries:
+            print(results_fn, *(summary[column] for column in columns), sep='\t', file=mysummary)
+    print(len(summaries), "results files summarised in", summary_txt)
@@ -0,0 +1,163 @@
+import json
+import sys
+import time
+import numpy as np
+
+
+stages = ("decode", "roi", "motion_gate", "create_mask", "detect_contours", "calculate_distance", "write", "draw_lines", "HUD_info", "output", "export") #stages of the tracking loop
+
+
+class StageTimer:
+    """
+    This class records the wall time spent in each stage of the tracking loop, for every frame.
+    Call lap(stage) at the end of each stage (the time since the previous lap is added to that stage) and
+    next_frame() at the end of each frame. When several tanks are tracked in one video their times are added together.
+    "decode" is the time the tracking loop waits for the next decoded frame.
+    A timer with enabled=False does nothing, so the tracking loop can always call it.
+
+    Parameters
+    ----------
+    stages: list
+        names of the stages of the tracking loop
+    enabled: bool
+        if False no times are recorded
+    """
+    def __init__(self, stages=stages, enabled=True):
+        self.stages = tuple(stages)
+        self.enabled = enabled
+        self.nframes = 0
+        self.seconds = 0.0 #wall time from start() to the last next_frame()
+        self.times = np.zeros((1024, len(self.stages))) #seconds spent in each stage (columns) of each frame (rows)
+        self._index = {stage: i for i, stage in enumerate(self.stages)}
+        self._row = [0.0] * len(self.stages)
+        self._start = None
+        self._last = None
+        if not enabled:
+            self.start = self.lap = self.next_frame = self._skip
+
+    def _skip(self, *args):
+        pass
+
+    def start(self):
+        """
+        Start timing, before the first frame is read.
+        """
+        self._start = self._last = time.perf_counter()
+
+    def lap(self, stage):
+        """
+        Add the time since the previous lap to stage.
+        """
+        now = time.perf_counter()
+        self._row[self._index[stage]] += now - self._last
+        self._last = now
+
+    def next_frame(self):
+        """
+        Store the times of this frame and start the next frame.
+        """
+        if self.nframes == len(self.times):
+            self.times = np.concatenate((self.times, np.zeros_like(self.times))) #make space for more frames
+        self.times[self.nframes] = self._row
+        self._row = [0.0] * len(self.stages)
+        self.nframes += 1
+        self.seconds = time.perf_counter() - self._start
+
+    def summary(self):
+        """
+        Returns the number of frames, total time and frames per second and the mean, p50 (median) and p99 time (ms)
+        and total time (s) of each stage, as a dictionary which can be saved with json.
+        """
+        times = self.times[:self.nframes]
+        summary = {"frames": self.nframes, "seconds": self.seconds,
+                   "fps": self.nframes / self.seconds if self.seconds else 0.0, "stages": {}}
+        for i, stage in enumerate(self.stages):
+            stage_times = times[:, i]
+            if self.nframes == 0 or not stage_times.any():
+                continue #stage not run (eg drawing stages when headless)
+            summary["stages"][stage] = {"mean_ms": float(stage_times.mean()) * 1000,
+                                        "p50_ms": float(np.percentile(stage_times, 50)) * 1000,
+                                        "p99_ms": float(np.percentile(stage_times, 99)) * 1000,
+                                        "total_s": float(stage_times.sum())}
+        return summary
+
+
+def print_summary(summary, title="", file=None):
+    """
+    This function prints a summary of the stage times (see StageTimer.summary) as a table.
+
+    Parameters
+    ----------
+    summary: dict
+        summary of the stage times
+    title: str
+        printed above the table (eg the video name)
+    file: file
+        where the table is printed, the console by default
+    """
+    print(title, "{} frames in {:.2f}s ({:.1f} fps)".format(summary["frames"], summary["seconds"], summary["fps"]), file=file)
+    print("{:<20}{:>10}{:>10}{:>10}{:>10}{:>8}".format("stage", "mean_ms", "p50_ms", "p99_ms", "total_s", "%"), file=file)
+    total = sum(stage["total_s"] for stage in summary["stages"].values()) or 1.0
+    for name, stage in summary["stages"].items():
+        print("{:<20}{:>10.3f}{:>10.3f}{:>10.3f}{:>10.2f}{:>8.1f}".format(name, stage["mean_ms"], stage["p50_ms"], stage["p99_ms"], stage["total_s"], 100 * stage["total_s"] / total), file=file)
+
+def save_summary(summary, profile_json, **info):
+    """
+    This function saves a summary of the stage times (see StageTimer.summary) as a json file so that runs can be compared (see compare_summaries).
+
+    Parameters
+    ----------
+    summary: dict
+        summary of the stage times
+    profile_json: str
+        location of the json file
+    info:
+        anything else to save with the summary, eg the video, tracker settings and OpenCV version
+    """
+    with open(profile_json, 'w') as myprofile:
+        json.dump(dict(info, **summary), myprofile, indent=1)
+
+def compare_summaries(old_json, new_json, tolerance=0.10):
+    """
+    This function compares the stage times saved by two runs (see save_summary) and prints the change in the mean time of each stage.
+    Returns the stages (and "fps") which are slower in the new run by more than tolerance, eg 0.10 = 10% slower.
+
+    Parameters
+    ----------
+    old_json: str
+        location of the summary of the old (reference) run
+    new_json: str
+        location of the summary of the new run
+    tolerance: float
+        the proportion a stage can slow down before it is reported as slower
+    """
+    with open(old_json) as f:
+        old = json.load(f)
+    with open(new_json) as f:
+        new = json.load(f)
+    slower = []
+    print("{:<20}{:>10}{:>10}{:>9}".format("stage", "old_ms", "new_ms", "change"))
+    for name, stage in new["stages"].items():
+        if name not in old["stages"]:
+            continue
+        old_ms = old["stages"][name]["mean_ms"]
+        change = stage["mean_ms"] / old_ms - 1 if old_ms else 0.0
+        flag = ""
+        if change > tolerance:
+            slower.append(name)
+            flag = "  SLOWER"
+        print("{:<20}{:>10.3f}{:>10.3f}{:>+8.0%}{}".format(name, old_ms, stage["mean_ms"], change, flag))
+    change = new["fps"] / old["fps"] - 1 if old["fps"] else 0.0
+    if change < -tolerance:
+        slower.append("fps")
+    print("fps: {:.1f} -> {:.1f} ({:+.0%})".format(old["fps"], new["fps"], change))
+    return slower
+
+
+if __name__ == "__main__":
+    #compare two saved profiles: python Tracking_profiler.py old_profile.json new_profile.json
+    #exits with 1 if any stage is more than 10% slower
+    slower = compare_summaries(sys.argv[1], sys.argv[2])
+    if slower:
+        print("slower:", ', '.join(slower))
+    sys.exit(1 if slower else 0)
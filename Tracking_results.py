@@ -0,0 +1,148 @@
+import numpy as np
+
+
+columns = ('FrameNo', 'Xcentroid', 'Ycentroid', 'DistX', 'DistY', 'PixelDist', 'CumulPixelDist') #columns recorded for each frame
+dtypes = (np.int32, np.int32, np.int32, np.int32, np.int32, np.float64, np.float64)
+step_dtypes = (np.int32, np.int32, np.int32, np.float64, np.float64, np.float64, np.float64) #DistX and DistY are per frame averages when frames are skipped
+suffixes = {"txt": '.txt', "npz": '.npz', "parquet": '.parquet'}
+
+
+class ResultsWriter:
+    """
+    This class stores the results of one tadpole, one frame at a time, in preallocated arrays and
+    writes them to the results file in blocks instead of formatting and writing every frame separately.
+    The results file is named results_fn + the suffix of the format:
+        "txt" : tab separated text file with a header line, the same as the original results files (ACT_tadpoleID_trial.txt)
+        "npz" : compressed numpy file with one array per column (TadpoleID and TrialID are stored once),
+                written when the writer is closed
+        "parquet" : parquet table with the same columns as the text file, needs the pyarrow package
+    Call close() when the video is finished so the last block is written.
+
+    Parameters
+    ----------
+    results_fn: str
+        location and name of the results file without the suffix
+    TadpoleID: str
+        tadpole ID written on each line of the results
+    TrialID: str
+        trial number written on each line of the results
+    results_format: str
+        "txt", "npz" or "parquet"
+    block_size: int
+        number of frames stored before they are written to the file
+    resume: dict
+        the rows already written to a txt results file (see checkpoint). The file is cut back to these rows and
+        new frames are added after them, instead of starting a new file
+    frame_step: int
+        if more than 1, only every frame_step-th frame is tracked and the distances are per video frame (see Tracker in Tracking_functions.py), 
+        so DistX and DistY are stored as floats
+    """
+    def __init__(self, results_fn, TadpoleID, TrialID, results_format="txt", block_size=1000, resume=None, frame_step=1):
+        if results_format not in suffixes:
+            raise ValueError("results_format should be one of {}, not {!r}".format(', '.join(suffixes), results_format))
+        self.path = results_fn + suffixes[results_format]
+        self.TadpoleID = TadpoleID
+        self.TrialID = TrialID
+        self.results_format = results_format
+        self.block_size = block_size
+        self.dtypes = step_dtypes if frame_step > 1 else dtypes
+        self.nrows = 0 #number of frames written to the file
+        self._n = 0 #number of frames waiting in the arrays
+        self._arrays = [np.empty(block_size, dtype) for dtype in self.dtypes]
+        self._cumul_int = np.zeros(block_size, bool) #CumulPixelDist is the int 0 in the first frame of a track (see calculate_distance)
+        self._blocks = [] #blocks kept in memory until the npz file is written
+        self._file = None
+        self._closed = False
+        if resume is not None:
+            if results_format != "txt":
+                raise ValueError("only txt results files can be resumed, not {!r}".format(results_format))
+            self._file = open(self.path, 'r+') #keep the frames written before the checkpoint
+            self._file.truncate(resume["offset"]) #remove any frames written after the checkpoint
+            self._file.seek(resume["offset"])
+            self.nrows = resume["nrows"]
+        elif results_format == "txt":
+            self._file = open(self.path, 'w') #"w" = Overwite any exsisting contents.
+            print('TadpoleID', 'TrialID', *columns, sep='\t', file=self._file) #print header lines in results file, separate each column by "\t"
+        elif results_format == "parquet":
+            try:
+                import pyarrow
+                import pyarrow.parquet
+            except ImportError:
+                raise ImportError("results_format='parquet' needs the pyarrow package (pip install pyarrow)")
+            self._pa = pyarrow
+            fields = [pyarrow.field('TadpoleID', pyarrow.string()), pyarrow.field('TrialID', pyarrow.string())]
+            fields += [pyarrow.field(column, pyarrow.from_numpy_dtype(dtype)) for column, dtype in zip(columns, self.dtypes)]
+            self._schema = pyarrow.schema(fields)
+            self._file = pyarrow.parquet.ParquetWriter(self.path, self._schema, compression='zstd')
+
+    def append(self, frame_pos, cx, cy, ix, iy, Pixel_dist, cumul_dist_travelled):
+        """
+        Store the results of one frame, writing the block to the file when it is full.
+        """
+        n = self._n
+        for array, value in zip(self._arrays, (frame_pos, cx, cy, ix, iy, Pixel_dist, cumul_dist_travelled)):
+            array[n] = value
+        self._cumul_int[n] = isinstance(cumul_dist_travelled, int)
+        self._n = n + 1
+        if self._n == self.block_size:
+            self.flush()
+
+    def write_record(self, record, tracker=None):
+        """
+        Store the results of one frame from a TrackRecord (see Tracker in Tracking_functions.py), 
+        so the writer can be used as a sink of Tracker.stream.
+        """
+        self.append(*record)
+
+    def flush(self):
+        """
+        Write the stored frames to the file.
+        """
+        n = self._n
+        if n == 0:
+            return
+        if self.results_format == "txt":
+            frame, cx, cy, ix, iy, Pixel_dist, cumul = (array[:n].tolist() for array in self._arrays)
+            cumul = [int(value) if is_int else value for value, is_int in zip(cumul, self._cumul_int[:n].tolist())]
+            ids = self.TadpoleID + '\t' + self.TrialID
+            self._file.write(''.join('{}\t{}\t{}\t{}\t{}\t{}\t{}\t{}\n'.format(ids, *row) for row in zip(frame, cx, cy, ix, iy, Pixel_dist, cumul)))
+            self._file.flush()
+        elif self.results_format == "npz":
+            self._blocks.append([array[:n].copy() for array in self._arrays])
+        elif self.results_format == "parquet":
+            pa = self._pa
+            table = [pa.array([self.TadpoleID] * n, pa.string()), pa.array([self.TrialID] * n, pa.string())]
+            table += [pa.array(array[:n]) for array in self._arrays]
+            self._file.write_table(pa.Table.from_arrays(table, schema=self._schema))
+        self.nrows += n
+        self._n = 0
+
+    def checkpoint(self):
+        """
+        Write the stored frames to the file and return the number of rows written and, for txt files, the size of the file,
+        so the file can be resumed from this point (see resume).
+        """
+        self.flush()
+        return {"nrows": self.nrows, "offset": self._file.tell() if self.results_format == "txt" else None}
+
+    def close(self):
+        """
+        Write the last block and close the results file.
+        """
+        if self._closed:
+            return
+        self.flush()
+        self._closed = True
+        if self.results_format == "npz":
+            arrays = {column: np.concatenate([block[i] for block in self._blocks]) if self._blocks else np.empty(0, dtype)
+                      for i, (column, dtype) in enumerate(zip(columns, self.dtypes))}
+            np.savez_compressed(self.path, TadpoleID=self.TadpoleID, TrialID=self.TrialID, **arrays)
+            self._blocks = []
+        else:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,133 @@
+import itertools
+import os
+import time
+import Tracking_functions as tc
+from Tracking_cache import FrameCache
+
+
+setting_names = ("sub_varThreshold", "sub_learn_rate", "blur_kernal", "min_area", "max_area")
+
+
+def settings_grid(sub_varThreshold, sub_learn_rate, blur_kernal, min_area, max_area):
+    """
+    This function returns every combination of the tracker settings given, as a list of dictionaries.
+
+    Parameters
+    ----------
+    sub_varThreshold, sub_learn_rate, blur_kernal, min_area, max_area: list
+        the values of each tracker setting to try (see Track_Tadpole.py)
+    """
+    return [dict(zip(setting_names, values))
+            for values in itertools.product(sub_varThreshold, sub_learn_rate, blur_kernal, min_area, max_area)
+            if values[3] < values[4]] #min_area must be smaller than max_area
+
+def sweep_frames(frames, roi, grid, jump_dist=20):
+    """
+    This function tracks the same frames of one tank with every combination of tracker settings in grid.
+    Each combination has its own background subtractor and lists, and each frame is passed to all of them in turn.
+    Returns a summary of the track of each combination (with its settings):
+        frames : number of frames tracked
+        lost_frames : frames where no contour between min_area and max_area was found (the previous centroid is kept)
+        missing_frames : frames with no centroid at all (0)
+        jumps : steps longer than jump_dist pixels, usually a sign that something other than the tadpole was tracked
+        max_step : longest step in pixels
+        total_dist : cumulative distance travelled in pixels
+        seconds : time spent tracking
+
+    Parameters
+    ----------
+    frames: ndarray, shape(nframes, n_rows, n_cols)
+        greyscale tank container in each frame (see tc.read_roi_frames)
+    roi: array, int
+        tank container rectangle, to map the centroids back to whole frame coordinates
+    grid: list
+        tracker settings to try (see settings_grid)
+    jump_dist: float
+        steps longer than this many pixels are counted as jumps
+    """
+    trackers = []
+    for settings in grid:
+        trackers.append({"settings": settings, "tracker": tc.Tracker(roi, **settings),
+                         "lost_frames": 0, "missing_frames": 0, "jumps": 0, "max_step": 0.0, "total_dist": 0, "seconds": 0.0})
+    for frame_pos, frame in enumerate(frames):
+        for tracker in trackers:
+            start = time.perf_counter()
+            record = tracker["tracker"].track(frame, frame_pos)
+            tracker["lost_frames"] += tracker["tracker"].contour is None
+            tracker["missing_frames"] += record.cx == 0 or record.cy == 0
+            tracker["jumps"] += record.step > jump_dist
+            tracker["max_step"] = max(tracker["max_step"], record.step)
+            tracker["total_dist"] = record.cumulative
+            tracker["seconds"] += time.perf_counter() - start
+    return [dict(tracker["settings"], frames=len(frames), **{key: tracker[key] for key in ("lost_frames", "missing_frames", "jumps", "max_step", "total_dist", "seconds")})
+            for tracker in trackers]
+
+def sweep_video(vidx, tank_lines, grid, end_frame=None, cache=None, jump_dist=20):
+    """
+    This function decodes a video once and tracks each tank listed for it with every combination of tracker settings in grid (see sweep_frames).
+    Returns a dictionary of the summaries of each tank, keyed by ACT_tadpoleID_trial.
+
+    Parameters
+    ----------
+    vidx: str
+        location of the video file
+    tank_lines: list
+        lines of ACT_video_info.txt split into columns, one for each tank in this video
+    grid: list
+        tracker settings to try (see settings_grid)
+    end_frame: int
+        the last frame to track, by default 10 mins of video
+    cache: FrameCache
+        if given, the decoded frames of each tank are kept in the cache and memory-mapped from there when the sweep is run again,
+        so the video is only decoded once for every sweep (see Tracking_cache.py)
+    jump_dist: float
+        steps longer than this many pixels are counted as jumps
+    """
+    rois = [tc.tank_roi(line) for line in tank_lines]
+    names = ['_'.join(('ACT', line[tc.TadpoleID], line[tc.TrialID])) for line in tank_lines]
+    frame_numbers, frames = tc.read_roi_frames(vidx, rois, end_frame, cache)
+    return {name: sweep_frames(roi_frames, roi, grid, jump_dist) for name, roi_frames, roi in zip(names, frames, rois)}
+
+def print_table(summaries, file=None):
+    """
+    This function prints the summaries of a sweep (see sweep_frames) as a tab separated table, one line for each combination of settings.
+
+    Parameters
+    ----------
+    summaries: list
+        summary of the track of each combination of settings
+    file: file
+        where the table is printed, the console by default
+    """
+    columns = list(summaries[0]) if summaries else []
+    print(*columns, sep='\t', file=file)
+    for summary in summaries:
+        print(*(round(summary[column], 3) if isinstance(summary[column], float) else summary[column] for column in columns), sep='\t', file=file)
+
+
+if __name__ == "__main__":
+    #information to change
+    Batch = "7"
+    video_info = 'ACT_video_info.txt' #location of the txt file of video names
+    results_dir = 'Tracking_files' #folder where the comparison tables are stored (sweep_ACT_tadpoleID_trial.txt)
+    cache_dir = None #folder to keep the decoded frames in between sweeps (eg 'Tracking_files/frame_cache'), None = decode the video for each sweep
+    cache_gb = 20 #maximum size of the frame cache in gigabytes
+    end_frame = None #the last frame to track, None = 10 mins of video. Use a shorter section of the video to sweep faster
+    #values of each tracker setting to try, every combination is tracked
+    grid = settings_grid(sub_varThreshold=[90, 120, 150],
+                         sub_learn_rate=[-1, 0.05],
+                         blur_kernal=[(1,1), (5,5)],
+                         min_area=[100],
+                         max_area=[600, 900])
+
+    cache = FrameCache(cache_dir, cache_gb) if cache_dir else None
+    lines = tc.read_video_info(video_info, Batch, tc.BatchID)
+    for vidx, tank_lines in tc.group_by_video(lines, tc.columnvid):
+        start = time.perf_counter()
+        sweeps = sweep_video(vidx, tank_lines, grid, end_frame, cache)
+        for name, summaries in sweeps.items():
+            print(name)
+            print_table(summaries)
+            with open(os.path.join(results_dir, 'sweep_' + name + '.txt'), 'w') as mysweep:
+                print_table(summaries, file=mysweep)
+        print("{} settings x {} tanks in {:.1f}s".format(len(grid), len(sweeps), time.perf_counter() - start))